@@ -1,15 +1,32 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import func
-from models import User, ParkingConfig, ParkingSession, UserRole, VehicleType, StatusCode
-from database import get_db
-from pydantic import BaseModel
-from typing import Optional
-from passlib.context import CryptContext
-from datetime import datetime, timedelta, timezone
-
+from sqlalchemy import tuple_, union_all, update
+from models import User, ParkingConfig, ParkingSession, UserRole, VehicleType, StatusCode, now_vn
+from database import get_db, async_session, serialized_writes, dialect_insert
+from migrations import migrate
+from occupancy import (get_cached_config, invalidate_config_cache, reserve_slot, release_slot,
+                       resync_occupancy, get_occupancy, reconcile_periodically)
+from auth import hash_password, verify_password, create_session_token, decode_session_token
+from events import EventBus
+from schemas import (StatusResponse, UserResponse, LoginResponse, UserListResponse, ParkingConfigListResponse,
+                     ParkingSessionResult, GateEventBatchResponse, ParkingSessionResponse, ParkingSessionPage,
+                     ArchiveResponse, OccupancyResponse, StatsOccupancyResponse, EventStreamResponse,
+                     StatsSummaryResponse, StatsSeriesResponse, PeakHoursResponse, RowsResponse)
+from archive import ARCHIVE_AFTER_DAYS, archive_closed_sessions, archive_periodically, archive_tables
+from idempotency import claim_event, store_event_response, release_event, purge_periodically
+from stats import (GRANULARITIES, record_checkin, record_checkout, rebuild_rollups, get_summary, get_series,
+                   get_peak_hours)
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+from datetime import date, datetime, timedelta, timezone
+
+import asyncio
+import base64
+import orjson
+import os
 import re
 
 app = FastAPI()
@@ -21,6 +38,33 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+def json_default(value):
+    # same datetime format as the JSON endpoints
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+# check-in/check-out events for the admin pages, see /events
+events = EventBus(json_default)
+
+# seconds after a check-in or check-out in which another read of the same plate is a
+# duplicate (second camera, repeated recognition) rather than the car moving again
+AUTO_CHECK_MIN_INTERVAL = float(os.getenv("AUTO_CHECK_MIN_INTERVAL", "10"))
+AUTO_CHECK_BATCH_MAX = 5000  # events per /auto_check/batch request
+
+
+@app.on_event("startup")
+async def startup_event():
+    # bring older databases up to the current schema, then fresh occupancy counters
+    await migrate()
+    async with async_session() as db:
+        await resync_occupancy(db)
+    asyncio.create_task(reconcile_periodically())
+    asyncio.create_task(purge_periodically())
+    asyncio.create_task(archive_periodically())
+
 # User Management Models
 
 
@@ -61,30 +105,27 @@ class LicensePlateInput(BaseModel):
     license_plate: str
 
 
-class ParkingSessionResult(BaseModel):
-    status: str
-    message: str
-    license_plate: str
-    vehicle_type: str
-    time_in: Optional[datetime] = None
-    time_out: Optional[datetime] = None
-    fee: Optional[float] = None
-
-
-# User Management APIs
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+class GateEvent(LicensePlateInput):
+    # a plate read as sent by the recognizer; every field but the plate is optional
+    event_id: Optional[str] = None  # idempotency key
+    lane: Optional[str] = None
+    direction: Optional[Literal["in", "out"]] = None  # None: toggle between check-in and check-out
+    timestamp: Optional[datetime] = None  # event time, unix seconds or ISO 8601; default now
 
 
-def hash_password(password: str):
-    return pwd_context.hash(password)
+class GateEventBatch(BaseModel):
+    events: List[GateEvent] = Field(..., max_length=AUTO_CHECK_BATCH_MAX)
 
 
-def verify_password(plain_password: str, hashed_password: str):
-    return pwd_context.verify(plain_password, hashed_password)
+# User Management APIs
 
 
-@app.post("/admin/create_user", tags=["Admin"])
+@app.post("/admin/create_user", tags=["Admin"],
+          response_model=StatusResponse, response_model_exclude_unset=True)
 async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    # hash before touching the database, so no pooled connection is held while bcrypt runs
+    hashed_password = await hash_password(user.password)
+
     # Check if user already exists
     result = await db.execute(select(User).filter(User.username == user.username))
     if result.scalars().first():
@@ -93,7 +134,6 @@ async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(User).filter(User.email == user.email))
     if result.scalars().first():
         return {"status": StatusCode.ERROR, "message": "Email đã tồn tại"}
-    hashed_password = hash_password(user.password)
     new_user = User(
         username=user.username,
         email=user.email,
@@ -105,11 +145,14 @@ async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
     return {"status": StatusCode.SUCCESS, "message": "Tạo người dùng thành công"}
 
 
-@app.post("/login", tags=["User"])
+@app.post("/login", tags=["User"],
+          response_model=LoginResponse, response_model_exclude_unset=True)
 async def login(username: str, password: str, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(User).filter(User.username == username))
     user = result.scalars().first()
-    if not user or not verify_password(password, user.hashed_password):
+    # give the connection back to the pool before the slow verification
+    await db.close()
+    if not user or not await verify_password(password, user.hashed_password):
         return {"status": StatusCode.ERROR, "message": "Tên người dùng hoặc mật khẩu không đúng"}
     if not user.is_active:
         return {"status": StatusCode.ERROR, "message": "Tài khoản đã bị khóa"}
@@ -121,20 +164,38 @@ async def login(username: str, password: str, db: AsyncSession = Depends(get_db)
             "email": user.email,
             "role": user.role,
             "is_active": user.is_active
-        }
+        },
+        "token": create_session_token(user.username, user.role)
     }
 
 
-@app.put("/admin/modify_user_info/{username}", tags=["Admin"])
+@app.get("/session", tags=["User"],
+         response_model=UserResponse, response_model_exclude_unset=True)
+async def get_session(request: Request):
+    # checks the token issued by /login (Authorization: Bearer ...), no password or database work
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    claims = decode_session_token(token) if scheme.lower() == "bearer" else None
+    if not claims:
+        return {"status": StatusCode.ERROR, "message": "Phiên đăng nhập không hợp lệ hoặc đã hết hạn"}
+    return {
+        "status": StatusCode.SUCCESS,
+        "message": "Phiên đăng nhập hợp lệ",
+        "user": {"username": claims["sub"], "role": claims["role"]}
+    }
+
+
+@app.put("/admin/modify_user_info/{username}", tags=["Admin"],
+         response_model=StatusResponse, response_model_exclude_unset=True)
 async def modify_user_info(username: str, user_update: UserUpdate, db: AsyncSession = Depends(get_db)):
+    hashed_password = await hash_password(user_update.password) if user_update.password else None
     result = await db.execute(select(User).filter(User.username == username))
     user = result.scalars().first()
 
     if not user:
         return {"status": StatusCode.ERROR, "message": "Không tìm thấy người dùng"}
 
-    if user_update.password:
-        user.hashed_password = hash_password(user_update.password)
+    if hashed_password:
+        user.hashed_password = hashed_password
     if user_update.role:
         user.role = user_update.role
     if user_update.is_active is not None:
@@ -144,7 +205,8 @@ async def modify_user_info(username: str, user_update: UserUpdate, db: AsyncSess
     return {"status": StatusCode.SUCCESS, "message": "Cập nhật thông tin người dùng thành công"}
 
 
-@app.get("/get_user_info/{username}", tags=["User"])
+@app.get("/get_user_info/{username}", tags=["User"],
+         response_model=UserResponse, response_model_exclude_unset=True)
 async def get_user_info(username: str, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(User).filter(User.username == username))
     user = result.scalars().first()
@@ -166,26 +228,20 @@ async def get_user_info(username: str, db: AsyncSession = Depends(get_db)):
     }
 
 
-@app.get("/admin/get_all_users", tags=["Admin"])
+@app.get("/admin/get_all_users", tags=["Admin"],
+         response_model=UserListResponse, response_model_exclude_unset=True)
 async def get_all_users(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(User))
-    users = result.scalars().all()
-    return {
+    # plain rows without the password hash, rendered as they are
+    result = await db.execute(select(User.username, User.email, User.role, User.is_active, User.created_at))
+    return RowsResponse({
         "status": StatusCode.SUCCESS,
         "message": "Lấy danh sách người dùng thành công",
-        "users": [
-            {
-                "username": user.username,
-                "email": user.email,
-                "role": user.role,
-                "is_active": user.is_active,
-                "created_at": user.created_at
-            } for user in users
-        ]
-    }
+        "users": [dict(row._mapping) for row in result]
+    })
 
 
-@app.delete("/admin/delete_user/{username}", tags=["Admin"])
+@app.delete("/admin/delete_user/{username}", tags=["Admin"],
+            response_model=StatusResponse, response_model_exclude_unset=True)
 async def delete_user(username: str, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(User).filter(User.username == username))
     user = result.scalars().first()
@@ -200,7 +256,8 @@ async def delete_user(username: str, db: AsyncSession = Depends(get_db)):
 # Parking Config APIs
 
 
-@app.get("/admin/get_parking_config", tags=["Admin"])
+@app.get("/admin/get_parking_config", tags=["Admin"],
+         response_model=ParkingConfigListResponse, response_model_exclude_unset=True)
 async def get_parking_config(db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(ParkingConfig))
     config = result.scalars().all()
@@ -222,7 +279,8 @@ async def get_parking_config(db: AsyncSession = Depends(get_db)):
     }
 
 
-@app.put("/admin/update_parking_config/{id}", tags=["Admin"])
+@app.put("/admin/update_parking_config/{id}", tags=["Admin"],
+         response_model=StatusResponse, response_model_exclude_unset=True)
 async def update_parking_config(id: int, config_update: ParkingConfigUpdate, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(ParkingConfig).filter(ParkingConfig.id == id))
     config = result.scalars().first()
@@ -237,10 +295,12 @@ async def update_parking_config(id: int, config_update: ParkingConfigUpdate, db:
         config.price_per_hour = config_update.price_per_hour
 
     await db.commit()
+    invalidate_config_cache()
     return {"status": StatusCode.SUCCESS, "message": "Cập nhật thông tin bãi đỗ thành công"}
 
 
-@app.delete("/admin/delete_parking_config/{id}", tags=["Admin"])
+@app.delete("/admin/delete_parking_config/{id}", tags=["Admin"],
+            response_model=StatusResponse, response_model_exclude_unset=True)
 async def delete_parking_config(id: int, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(ParkingConfig).filter(ParkingConfig.id == id))
     config = result.scalars().first()
@@ -249,6 +309,7 @@ async def delete_parking_config(id: int, db: AsyncSession = Depends(get_db)):
 
     await db.delete(config)
     await db.commit()
+    invalidate_config_cache()
     return {"status": StatusCode.SUCCESS, "message": "Xóa thông tin bãi đỗ thành công"}
 
 # Parking Session APIs
@@ -272,94 +333,221 @@ def detect_vehicle_type(license_plate: str) -> VehicleType:
         raise ValueError("Không xác định được loại xe")
 
 
-async def checkin(db: AsyncSession, license_plate: str):
+def session_event(session: ParkingSession) -> dict:
+    # same fields as a row of /get_all_parking_sessions
+    return {
+        "id": session.id,
+        "license_plate": session.license_plate,
+        "vehicle_type": session.vehicle_type,
+        "time_in": session.time_in,
+        "time_out": session.time_out,
+        "fee": session.fee,
+        "status": session.status
+    }
+
+
+def session_result(message: str, session: dict) -> ParkingSessionResult:
+    return ParkingSessionResult(
+        status=StatusCode.SUCCESS,
+        message=message,
+        license_plate=session["license_plate"],
+        vehicle_type=session["vehicle_type"],
+        time_in=session["time_in"],
+        time_out=session["time_out"],
+        fee=session["fee"]
+    )
+
+
+async def checkin(db: AsyncSession, license_plate: str, at: datetime):
+    # returns the response and the new session, None when nothing was written
     vehicle_type = detect_vehicle_type(license_plate)
-    result = await db.execute(select(ParkingConfig).filter(ParkingConfig.vehicle_type == vehicle_type))
-    config = result.scalars().first()
+    config = await get_cached_config(db, vehicle_type)
 
     if not config:
-        return {"status": StatusCode.ERROR, "message": "Không tìm thấy cấu hình bãi đỗ cho loại xe này"}
-
-    result = await db.execute(select(func.count(ParkingSession.license_plate)).filter(
-        ParkingSession.vehicle_type == vehicle_type,
+        return {"status": StatusCode.ERROR, "message": "Không tìm thấy cấu hình bãi đỗ cho loại xe này"}, None
+
+    # capacity check and counter increment commit together with the new session
+    if not await reserve_slot(db, vehicle_type, config.max_capacity):
+        return {"status": StatusCode.ERROR, "message": "Bãi đỗ đã đầy"}, None
+
+    # one statement against ux_parking_sessions_active_plate: no row back means another
+    # gate checked the same plate in after our lookup
+    inserted = await db.execute(dialect_insert(ParkingSession).values(
+        license_plate=license_plate, vehicle_type=vehicle_type, time_in=at, status="active"
+    ).on_conflict_do_nothing(
+        index_elements=["license_plate"], index_where=ParkingSession.status == "active"
+    ).returning(ParkingSession.id))
+    session_id = inserted.scalar()
+    if session_id is None:
+        await release_slot(db, vehicle_type)
+        return await current_state(db, license_plate, "Xe đã ở trong bãi"), None
+
+    await record_checkin(db, vehicle_type, at)
+    session = {"id": session_id, "license_plate": license_plate, "vehicle_type": vehicle_type,
+               "time_in": at, "time_out": None, "fee": None, "status": "active"}
+    return session_result("Xe vào bãi thành công", session), session
+
+
+async def checkout(db: AsyncSession, session: ParkingSession, at: datetime):
+    # returns the response and the closed session, None when nothing was written
+    time_out = max(at, session.time_in)
+    fee = None
+    config = await get_cached_config(db, session.vehicle_type)
+    if config:
+        duration = (time_out - session.time_in).total_seconds() / 3600
+        fee = config.price_per_hour * duration
+    # conditional on the session still being active, so two gates cannot both close it
+    closed = await db.execute(update(ParkingSession).where(
+        ParkingSession.id == session.id,
         ParkingSession.status == "active"
-    ))
+    ).values(status="closed", time_out=time_out, fee=fee).execution_options(synchronize_session=False))
+    if not closed.rowcount:
+        return await current_state(db, session.license_plate, "Xe đã ra khỏi bãi"), None
+    await release_slot(db, session.vehicle_type)
+    await record_checkout(db, session.vehicle_type, session.time_in, time_out, fee)
 
-    active_sessions = result.scalars().first()
-    if active_sessions >= config.max_capacity:
-        return {"status": StatusCode.ERROR, "message": "Bãi đỗ đã đầy"}
+    closed_session = dict(session_event(session), time_out=time_out, fee=fee, status="closed")
+    return session_result("Xe ra khỏi bãi thành công", closed_session), closed_session
 
-    # result = await db.execute(select(ParkingSession).filter(
-    #     ParkingSession.license_plate == license_plate,
-    #     ParkingSession.status == "active"
-    # ))
-    # existing_session = result.scalars().first()
 
-    # if existing_session:
-    #     raise HTTPException(status_code=400, detail="Xe chưa ra khỏi bãi")
+# Statements of the gate path, built here so that migrations.check_query_plans explains
+# exactly the SQL these endpoints run.
 
-    new_session = ParkingSession(
-        license_plate=license_plate,
-        vehicle_type=vehicle_type
-    )
-    db.add(new_session)
-    await db.commit()
-    return ParkingSessionResult(
-        status=StatusCode.SUCCESS,
-        message="Xe vào bãi thành công",
-        license_plate=license_plate,
-        vehicle_type=vehicle_type,
-        time_in=new_session.time_in,
-        time_out=None,
-        fee=None
+
+def active_session_query(license_plate: str):
+    return select(ParkingSession).filter(
+        ParkingSession.license_plate == license_plate,
+        ParkingSession.status == "active"
     )
 
 
-async def checkout(db: AsyncSession, session: ParkingSession):
-    if not session:
-        return {"status": StatusCode.ERROR, "message": "Không tìm thấy phiên đỗ xe"}
+def current_state_query(license_plate: str):
+    # active (else latest) session of the plate
+    return select(*SESSION_COLUMNS).filter(
+        ParkingSession.license_plate == license_plate
+    ).order_by((ParkingSession.status == "active").desc(), ParkingSession.time_in.desc()).limit(1)
 
-    if session.status != "active":
-        return {"status": StatusCode.ERROR, "message": "Phiên đỗ xe đã được đóng"}
-    session.status = "closed"
-    session.time_out = datetime.now(
-        timezone(timedelta(hours=7))).replace(tzinfo=None)
-    result = await db.execute(select(ParkingConfig).filter(ParkingConfig.vehicle_type == session.vehicle_type))
-    config = result.scalars().first()
-    if config:
-        duration = (session.time_out - session.time_in).total_seconds() / 3600
-        session.fee = config.price_per_hour * duration
 
-    await db.commit()
-    return ParkingSessionResult(
-        status=StatusCode.SUCCESS,
-        message="Xe ra khỏi bãi thành công",
-        license_plate=session.license_plate,
-        vehicle_type=session.vehicle_type,
-        time_in=session.time_in,
-        time_out=session.time_out,
-        fee=session.fee
-    )
+def last_time_out_query(license_plate: str):
+    return select(ParkingSession.time_out).filter(
+        ParkingSession.license_plate == license_plate
+    ).order_by(ParkingSession.time_in.desc()).limit(1)
 
 
-@app.post("/auto_check", response_model=ParkingSessionResult, tags=["Parking"])
-async def auto_check(data: LicensePlateInput, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(ParkingSession).filter(
-        ParkingSession.license_plate == data.license_plate,
-        ParkingSession.status == "active"
-    ))
+def latest_session_query(license_plate: str):
+    return select(ParkingSession).filter(
+        ParkingSession.license_plate == license_plate
+    ).order_by(ParkingSession.time_in.desc())
+
+
+async def current_state(db: AsyncSession, license_plate: str, message: str):
+    # active (else latest) session of the plate, returned when a request turns out to be a duplicate
+    result = await db.execute(current_state_query(license_plate))
+    row = result.first()
+    if not row:
+        return {"status": StatusCode.ERROR, "message": "Không tìm thấy phiên đỗ xe"}
+    return session_result(message, dict(row._mapping))
+
+
+def event_time(timestamp: Optional[datetime]) -> datetime:
+    # the recognizer's event time as naive local time, never later than now
+    now = now_vn()
+    if timestamp is None:
+        return now
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone(timedelta(hours=7))).replace(tzinfo=None)
+    return min(timestamp, now)
+
+
+def recently_changed(moment: Optional[datetime], at: datetime) -> bool:
+    return moment is not None and abs((at - moment).total_seconds()) < AUTO_CHECK_MIN_INTERVAL
+
+
+async def apply_gate_event(db: AsyncSession, event: GateEvent, event_id: Optional[str] = None):
+    # One check-in or check-out at the event time, inside the caller's transaction.
+    # Returns the response and the session to publish once the caller has committed.
+    event_id = event_id or event.event_id
+    at = event_time(event.timestamp)
+    try:
+        detect_vehicle_type(event.license_plate)
+    except ValueError as e:
+        # an unreadable plate is answered, not raised: the recognizer would retry a 500 forever
+        return {"status": StatusCode.ERROR, "message": str(e)}, None
+    if event_id:
+        replayed = await claim_event(db, event_id, event.license_plate)
+        if replayed is not None:
+            return replayed, None
+    result = await db.execute(active_session_query(event.license_plate))
     session = result.scalars().first()
-    if session:
-        return await checkout(db, session)
+    changed = None
+    if session and event.direction == "in":
+        response = await current_state(db, event.license_plate, "Xe đã ở trong bãi")
+    elif session and recently_changed(session.time_in, at):
+        # a second camera reading the same car right after its check-in
+        response = await current_state(db, event.license_plate, "Xe vừa vào bãi, bỏ qua lần đọc trùng")
+    elif session:
+        response, changed = await checkout(db, session, at)
+    elif event.direction == "out":
+        response = await current_state(db, event.license_plate, "Xe không có trong bãi")
     else:
-        return await checkin(db, data.license_plate)
+        result = await db.execute(last_time_out_query(event.license_plate))
+        if recently_changed(result.scalar(), at):
+            response = await current_state(db, event.license_plate, "Xe vừa ra khỏi bãi, bỏ qua lần đọc trùng")
+        else:
+            response, changed = await checkin(db, event.license_plate, at)
+    if event_id:
+        if isinstance(response, ParkingSessionResult):
+            await store_event_response(db, event_id, response.model_dump_json())
+        else:
+            # errors are not remembered, a retry is evaluated again
+            await release_event(db, event_id)
+    return response, changed
+
+
+def publish_gate_event(session: dict):
+    events.publish("checkin" if session["status"] == "active" else "checkout", session)
+
+
+@app.post("/auto_check", tags=["Parking"],
+          response_model=ParkingSessionResult, response_model_exclude_unset=True)
+async def auto_check(data: GateEvent, idempotency_key: Optional[str] = Header(None),
+                     db: AsyncSession = Depends(get_db)):
+    async with serialized_writes():
+        response, changed = await apply_gate_event(db, data, idempotency_key)
+        # the idempotency key, the session change and the counters commit together
+        await db.commit()
+    if changed:
+        publish_gate_event(changed)
+    return response
+
+
+@app.post("/auto_check/batch", tags=["Parking"],
+          response_model=GateEventBatchResponse, response_model_exclude_unset=True)
+async def auto_check_batch(batch: GateEventBatch, db: AsyncSession = Depends(get_db)):
+    # Replays of recognizer events (spool, offline gates): applied in event-time order in
+    # one transaction, results in the order of the request
+    order = sorted(range(len(batch.events)), key=lambda i: event_time(batch.events[i].timestamp))
+    results = [None] * len(batch.events)
+    changes = []
+    async with serialized_writes():
+        for i in order:
+            results[i], changed = await apply_gate_event(db, batch.events[i])
+            if changed:
+                changes.append(changed)
+        await db.commit()
+    for changed in changes:
+        publish_gate_event(changed)
+    return {
+        "status": StatusCode.SUCCESS,
+        "message": f"Đã xử lý {len(results)} sự kiện",
+        "results": results
+    }
 
 
-@app.get("/get_parking_session/{license_plate}", tags=["Parking"])
+@app.get("/get_parking_session/{license_plate}", tags=["Parking"],
+         response_model=ParkingSessionResponse, response_model_exclude_unset=True)
 async def get_parking_session(license_plate: str, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(ParkingSession).filter(
-        ParkingSession.license_plate == license_plate
-    ).order_by(ParkingSession.time_in.desc()))
+    result = await db.execute(latest_session_query(license_plate))
     session = result.scalars().first()
     if not session:
         return {"status": StatusCode.ERROR, "message": "Không tìm thấy phiên đỗ xe"}
@@ -377,38 +565,139 @@ async def get_parking_session(license_plate: str, db: AsyncSession = Depends(get
     }
 
 
-@app.get("/get_all_parking_sessions", tags=["Parking"])
-async def get_all_parking_sessions(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(ParkingSession).order_by(ParkingSession.time_in.desc()))
-    sessions = result.scalars().all()
-    return {
+# Columns returned by the session listing and export; selected as plain rows so large
+# pages never build ORM objects.
+SESSION_COLUMNS = (ParkingSession.id, ParkingSession.license_plate, ParkingSession.vehicle_type,
+                   ParkingSession.time_in, ParkingSession.time_out, ParkingSession.fee, ParkingSession.status)
+SESSIONS_PAGE_MAX = 1000
+EXPORT_CHUNK_SIZE = 1000
+
+
+def encode_session_cursor(time_in: datetime, session_id: int) -> str:
+    raw = f"{time_in.isoformat()}|{session_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_session_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        time_in, session_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(time_in), int(session_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor không hợp lệ")
+
+
+def session_filters(table, date_from: Optional[datetime], date_to: Optional[datetime], plate_prefix: Optional[str],
+                    vehicle_type: Optional[VehicleType], status: Optional[str]):
+    conditions = []
+    if date_from:
+        conditions.append(table.c.time_in >= date_from)
+    if date_to:
+        conditions.append(table.c.time_in < date_to)
+    if plate_prefix:
+        # range instead of LIKE so the license_plate indexes apply (SQLite LIKE is case-insensitive)
+        prefix = plate_prefix.upper()
+        conditions.append(table.c.license_plate >= prefix)
+        conditions.append(table.c.license_plate < prefix + "\uffff")
+    if vehicle_type:
+        conditions.append(table.c.vehicle_type == vehicle_type.value)
+    if status:
+        conditions.append(table.c.status == status)
+    return conditions
+
+
+async def session_tables(db: AsyncSession, date_from: Optional[datetime], date_to: Optional[datetime]):
+    # parking_sessions, plus the archive months a date range reaches into; without a range
+    # only the recent sessions are listed
+    if date_from is None and date_to is None:
+        return [ParkingSession.__table__]
+    return [ParkingSession.__table__, *await archive_tables(db, date_from, date_to)]
+
+
+def sessions_query(tables, filters: dict, after=None, limit: Optional[int] = None):
+    # newest first over one or more session tables; each branch is limited on its own
+    # (time_in, id) index before the union is merged
+    branches = []
+    for table in tables:
+        query = select(*(table.c[column.key] for column in SESSION_COLUMNS)).where(
+            *session_filters(table, **filters))
+        if after:
+            query = query.where(tuple_(table.c.time_in, table.c.id) < tuple_(*after))
+        query = query.order_by(table.c.time_in.desc(), table.c.id.desc()).limit(limit)
+        if len(tables) == 1:
+            return query
+        branches.append(select(query.subquery()))
+    merged = union_all(*branches).subquery()
+    return select(merged).order_by(merged.c.time_in.desc(), merged.c.id.desc()).limit(limit)
+
+
+def session_row(row) -> dict:
+    # keys of the archive union are sqlalchemy label objects (a str subclass), which
+    # orjson refuses as dict keys
+    return {str(key): value for key, value in row._mapping.items()}
+
+
+@app.get("/get_all_parking_sessions", tags=["Parking"],
+         response_model=ParkingSessionPage, response_model_exclude_unset=True)
+async def get_all_parking_sessions(limit: int = Query(100, ge=1, le=SESSIONS_PAGE_MAX),
+                                   cursor: Optional[str] = None,
+                                   date_from: Optional[datetime] = None,
+                                   date_to: Optional[datetime] = None,
+                                   plate_prefix: Optional[str] = None,
+                                   vehicle_type: Optional[VehicleType] = None,
+                                   status: Optional[str] = None,
+                                   db: AsyncSession = Depends(get_db)):
+    # Newest first, keyset on (time_in, id): pass next_cursor back to get the following page
+    filters = dict(date_from=date_from, date_to=date_to, plate_prefix=plate_prefix,
+                   vehicle_type=vehicle_type, status=status)
+    after = decode_session_cursor(cursor) if cursor else None
+    query = sessions_query(await session_tables(db, date_from, date_to), filters, after, limit + 1)
+    rows = (await db.execute(query)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_session_cursor(rows[-1].time_in, rows[-1].id)
+    return RowsResponse({
         "status": StatusCode.SUCCESS,
         "message": "Lấy danh sách phiên đỗ xe thành công",
-        "sessions": [
-            {
-                "id": session.id,
-                "license_plate": session.license_plate,
-                "vehicle_type": session.vehicle_type,
-                "time_in": session.time_in,
-                "time_out": session.time_out,
-                "fee": session.fee,
-                "status": session.status
-            } for session in sessions
-        ]
-    }
-
-
-@app.put("/update_parking_session/{license_plate}", tags=["Parking"])
+        "sessions": [session_row(row) for row in rows],
+        "next_cursor": next_cursor
+    })
+
+
+@app.get("/export_parking_sessions", tags=["Parking"])
+async def export_parking_sessions(date_from: Optional[datetime] = None,
+                                  date_to: Optional[datetime] = None,
+                                  plate_prefix: Optional[str] = None,
+                                  vehicle_type: Optional[VehicleType] = None,
+                                  status: Optional[str] = None):
+    # NDJSON, one session per line, read from a server-side cursor in chunks
+    filters = dict(date_from=date_from, date_to=date_to, plate_prefix=plate_prefix,
+                   vehicle_type=vehicle_type, status=status)
+
+    async def rows():
+        # own session: a Depends(get_db) session is closed before the body is streamed
+        async with async_session() as db:
+            query = sessions_query(await session_tables(db, date_from, date_to), filters)
+            result = await db.stream(query.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+            async for partition in result.partitions():
+                yield b"".join(orjson.dumps(session_row(row), default=json_default) + b"\n" for row in partition)
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson",
+                             headers={"Content-Disposition": "attachment; filename=parking_sessions.ndjson"})
+
+
+@app.put("/update_parking_session/{license_plate}", tags=["Parking"],
+         response_model=ParkingSessionResponse, response_model_exclude_unset=True)
 async def update_parking_session(license_plate: str, session_update: ParkingSessionUpdate, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(ParkingSession).filter(
-        ParkingSession.license_plate == license_plate,
-        ParkingSession.status == "active"
-    ))
+    result = await db.execute(active_session_query(license_plate))
     session = result.scalars().first()
     if not session:
         return {"status": StatusCode.ERROR, "message": "Không tìm thấy phiên đỗ xe"}
 
     if session_update.status:
+        if session_update.status != "active":
+            await release_slot(db, session.vehicle_type)
         session.status = session_update.status
     if session_update.time_out:
         session.time_out = session_update.time_out
@@ -428,7 +717,8 @@ async def update_parking_session(license_plate: str, session_update: ParkingSess
     }
 
 
-@app.delete("/delete_parking_session/{license_plate}", tags=["Parking"])
+@app.delete("/delete_parking_session/{license_plate}", tags=["Parking"],
+            response_model=StatusResponse, response_model_exclude_unset=True)
 async def delete_parking_session(id: int, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(ParkingSession).filter(
         ParkingSession.id == id,
@@ -437,6 +727,8 @@ async def delete_parking_session(id: int, db: AsyncSession = Depends(get_db)):
     if not session:
         return {"status": StatusCode.ERROR, "message": "Không tìm thấy phiên đỗ xe"}
 
+    if session.status == "active":
+        await release_slot(db, session.vehicle_type)
     await db.delete(session)
     await db.commit()
     return {
@@ -445,7 +737,8 @@ async def delete_parking_session(id: int, db: AsyncSession = Depends(get_db)):
     }
 
 
-@app.post("/admin/create_parking_config", tags=["Admin"])
+@app.post("/admin/create_parking_config", tags=["Admin"],
+          response_model=StatusResponse, response_model_exclude_unset=True)
 async def create_parking_config(id: int, vehicle_type: VehicleType, max_capacity: int, price_per_hour: float, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(ParkingConfig).filter(ParkingConfig.vehicle_type == vehicle_type))
     config = result.scalars().first()
@@ -460,4 +753,100 @@ async def create_parking_config(id: int, vehicle_type: VehicleType, max_capacity
     )
     db.add(new_config)
     await db.commit()
+    invalidate_config_cache()
     return {"status": StatusCode.SUCCESS, "message": "Tạo cấu hình bãi đỗ thành công"}
+
+
+@app.post("/admin/reconcile_occupancy", tags=["Admin"],
+          response_model=OccupancyResponse, response_model_exclude_unset=True)
+async def reconcile_occupancy_counters(db: AsyncSession = Depends(get_db)):
+    await resync_occupancy(db)
+    return {
+        "status": StatusCode.SUCCESS,
+        "message": "Đồng bộ số xe đang gửi thành công",
+        "occupancy": await get_occupancy(db)
+    }
+
+
+@app.post("/admin/rebuild_stats", tags=["Admin"],
+          response_model=StatusResponse, response_model_exclude_unset=True)
+async def rebuild_stats(db: AsyncSession = Depends(get_db)):
+    # sessions edited or deleted by hand are not reflected in the rollups until this runs
+    await rebuild_rollups(db)
+    await db.commit()
+    return {"status": StatusCode.SUCCESS, "message": "Tính lại thống kê thành công"}
+
+
+@app.post("/admin/archive_sessions", tags=["Admin"],
+          response_model=ArchiveResponse, response_model_exclude_unset=True)
+async def archive_sessions(older_than_days: int = Query(ARCHIVE_AFTER_DAYS, ge=1), db: AsyncSession = Depends(get_db)):
+    # the same job that runs daily; returns the number of sessions moved per month
+    moved = await archive_closed_sessions(db, older_than_days)
+    return {
+        "status": StatusCode.SUCCESS,
+        "message": f"Đã lưu trữ {sum(moved.values())} phiên đỗ xe",
+        "archived": moved
+    }
+
+
+@app.get("/events", tags=["Parking"])
+async def parking_events(request: Request, since: Optional[str] = None):
+    # Server-Sent Events; EventSource resumes with Last-Event-ID, other clients may pass ?since=
+    last_event_id = request.headers.get("last-event-id") or since
+    return StreamingResponse(events.stream(last_event_id), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.get("/stats/events", tags=["Stats"],
+         response_model=EventStreamResponse, response_model_exclude_unset=True)
+async def stats_events():
+    return {"status": StatusCode.SUCCESS, "message": "Lấy trạng thái luồng sự kiện thành công", **events.stats()}
+
+
+# Statistics, served from the occupancy counters and the hourly/daily rollups
+
+
+@app.get("/stats/summary", tags=["Stats"],
+         response_model=StatsSummaryResponse, response_model_exclude_unset=True)
+async def stats_summary(date_from: Optional[date] = None, date_to: Optional[date] = None,
+                        db: AsyncSession = Depends(get_db)):
+    return {
+        "status": StatusCode.SUCCESS,
+        "message": "Lấy thống kê tổng quan thành công",
+        **await get_summary(db, date_from, date_to)
+    }
+
+
+@app.get("/stats/occupancy", tags=["Stats"],
+         response_model=StatsOccupancyResponse, response_model_exclude_unset=True)
+async def stats_occupancy(db: AsyncSession = Depends(get_db)):
+    occupancy = await get_occupancy(db)
+    result = {}
+    for vehicle_type, active in occupancy.items():
+        config = await get_cached_config(db, vehicle_type)
+        result[vehicle_type] = {"active": active, "max_capacity": config.max_capacity if config else None}
+    return {"status": StatusCode.SUCCESS, "message": "Lấy số xe đang gửi thành công", "occupancy": result}
+
+
+@app.get("/stats/series", tags=["Stats"],
+         response_model=StatsSeriesResponse, response_model_exclude_unset=True)
+async def stats_series(granularity: str = Query("day", pattern="^(" + "|".join(GRANULARITIES) + ")$"),
+                       date_from: Optional[date] = None, date_to: Optional[date] = None,
+                       vehicle_type: Optional[VehicleType] = None, db: AsyncSession = Depends(get_db)):
+    # check-ins, check-outs, revenue and average dwell time per hour, day or month
+    return {
+        "status": StatusCode.SUCCESS,
+        "message": "Lấy thống kê theo thời gian thành công",
+        "series": await get_series(db, granularity, date_from, date_to, vehicle_type and vehicle_type.value)
+    }
+
+
+@app.get("/stats/peak_hours", tags=["Stats"],
+         response_model=PeakHoursResponse, response_model_exclude_unset=True)
+async def stats_peak_hours(date_from: Optional[date] = None, date_to: Optional[date] = None,
+                           vehicle_type: Optional[VehicleType] = None, db: AsyncSession = Depends(get_db)):
+    return {
+        "status": StatusCode.SUCCESS,
+        "message": "Lấy thống kê giờ cao điểm thành công",
+        "hours": await get_peak_hours(db, date_from, date_to, vehicle_type and vehicle_type.value)
+    }
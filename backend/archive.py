@@ -0,0 +1,119 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import Column, DateTime, Float, Index, Integer, MetaData, String, Table, delete, func, inspect, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from database import async_session, dialect_insert, serialized_writes
+from models import ParkingSession, SessionArchive, now_vn
+
+# Closed sessions older than ARCHIVE_AFTER_DAYS move out of parking_sessions into one
+# table per month of time_in (parking_sessions_YYYY_MM), registered in session_archives.
+# parking_sessions keeps the active and recent sessions only, so the gate lookups and
+# the default session listing stay on a table that fits in the page cache; listings
+# and exports with a date range also read the archive months the range reaches into.
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_INTERVAL = 24 * 3600  # seconds between archival runs
+
+SESSION_FIELDS = ("id", "license_plate", "vehicle_type", "time_in", "time_out", "fee", "status", "created_at")
+
+_archive_metadata = MetaData()
+
+
+def month_start(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, 1)
+
+
+def next_month(moment: datetime) -> datetime:
+    return datetime(moment.year + moment.month // 12, moment.month % 12 + 1, 1)
+
+
+def archive_table(month: str) -> Table:
+    # same columns as parking_sessions; ids are kept, so (time_in, id) stays unique across tables
+    name = "parking_sessions_" + month.replace("-", "_")
+    if name in _archive_metadata.tables:
+        return _archive_metadata.tables[name]
+    return Table(
+        name, _archive_metadata,
+        Column("id", Integer, primary_key=True, autoincrement=False),
+        Column("license_plate", String),
+        Column("vehicle_type", String),
+        Column("time_in", DateTime),
+        Column("time_out", DateTime, nullable=True),
+        Column("fee", Float, nullable=True),
+        Column("status", String),
+        Column("created_at", DateTime),
+        Index(f"ix_{name}_time_in_id", "time_in", "id"),
+        Index(f"ix_{name}_plate_time_in", "license_plate", "time_in"),
+    )
+
+
+def _overlapping(query, date_from: Optional[datetime], date_to: Optional[datetime]):
+    # months are compared as YYYY-MM strings
+    if date_from:
+        query = query.where(SessionArchive.month >= date_from.strftime("%Y-%m"))
+    if date_to:
+        query = query.where(SessionArchive.month < next_month(date_to - timedelta(microseconds=1)).strftime("%Y-%m"))
+    return query.order_by(SessionArchive.month.desc())
+
+
+def archive_tables_sync(conn, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None) -> List[Table]:
+    # on a sync connection (stats rebuild, migrations); session_archives may not exist yet there
+    if not inspect(conn).has_table(SessionArchive.__tablename__):
+        return []
+    months = conn.execute(_overlapping(select(SessionArchive.month), date_from, date_to)).scalars()
+    return [archive_table(month) for month in months]
+
+
+async def archive_tables(db: AsyncSession, date_from: Optional[datetime] = None,
+                         date_to: Optional[datetime] = None) -> List[Table]:
+    # archive months overlapping [date_from, date_to), newest first
+    months = (await db.execute(_overlapping(select(SessionArchive.month), date_from, date_to))).scalars()
+    return [archive_table(month) for month in months]
+
+
+async def archive_closed_sessions(db: AsyncSession, older_than_days: int = ARCHIVE_AFTER_DAYS) -> dict:
+    # moves closed sessions whose time_out is older than the cutoff, one transaction per month
+    cutoff = now_vn() - timedelta(days=older_than_days)
+    archivable = (ParkingSession.status != "active", ParkingSession.time_out < cutoff)
+    oldest = (await db.execute(select(func.min(ParkingSession.time_in)).where(*archivable))).scalar()
+    moved = {}
+    month = month_start(oldest) if oldest else None
+    while month is not None and month < cutoff:
+        start, end = month, next_month(month)
+        month = end
+        in_month = (*archivable, ParkingSession.time_in >= start, ParkingSession.time_in < end)
+        async with serialized_writes():
+            count = (await db.execute(select(func.count(ParkingSession.id)).where(*in_month))).scalar()
+            if not count:
+                await db.rollback()
+                continue
+            name = start.strftime("%Y-%m")
+            table = archive_table(name)
+            await db.run_sync(lambda session: table.create(session.connection(), checkfirst=True))
+            columns = [getattr(ParkingSession, field) for field in SESSION_FIELDS]
+            await db.execute(insert(table).from_select(list(SESSION_FIELDS), select(*columns).where(*in_month)))
+            await db.execute(delete(ParkingSession).where(*in_month).execution_options(synchronize_session=False))
+            stmt = dialect_insert(SessionArchive).values(
+                month=name, table_name=table.name, row_count=count, archived_at=now_vn())
+            await db.execute(stmt.on_conflict_do_update(
+                index_elements=["month"],
+                set_={"row_count": SessionArchive.row_count + stmt.excluded.row_count,
+                      "archived_at": stmt.excluded.archived_at}))
+            await db.commit()
+        moved[name] = count
+    return moved
+
+
+async def archive_periodically():
+    while True:
+        await asyncio.sleep(ARCHIVE_INTERVAL)
+        try:
+            async with async_session() as db:
+                await archive_closed_sessions(db)
+        except Exception as e:
+            print(f"Session archival failed: {e}")
@@ -0,0 +1,72 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from jose import JWTError, jwt
+from passlib.context import CryptContext
+
+# Password hashing and session tokens. bcrypt is slow on purpose (100-300 ms per call),
+# so it runs on a small dedicated pool instead of the event loop; bcrypt releases the GIL,
+# and the gate endpoints keep being served while a burst of logins is hashed.
+
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", "2"))
+# tokens signed with a per-process key stop validating after a restart and on every other
+# worker; set SECRET_KEY (docker-compose.yml reads it from .env) to keep sessions valid
+SECRET_KEY = os.getenv("SECRET_KEY")
+if not SECRET_KEY:
+    SECRET_KEY = secrets.token_urlsafe(32)
+    print("WARNING: SECRET_KEY is not set, session tokens are signed with a random key of this "
+          "process and stop working after a restart or on another worker")
+TOKEN_ALGORITHM = "HS256"
+TOKEN_TTL = timedelta(hours=int(os.getenv("SESSION_TOKEN_HOURS", "168")))  # 7 days, same as the user cookie
+VERIFIED_CACHE_TTL = 300  # seconds a successful verification is remembered
+VERIFIED_CACHE_SIZE = 1024
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_pool = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="bcrypt")
+
+# credential fingerprint -> expiry; the stored hash is part of the fingerprint, so a
+# password change invalidates the entry without any bookkeeping
+_verified = {}
+
+
+def _fingerprint(plain_password: str, hashed_password: str) -> bytes:
+    return hmac.new(SECRET_KEY.encode(), f"{hashed_password}\0{plain_password}".encode(), hashlib.sha256).digest()
+
+
+async def hash_password(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(password_pool, pwd_context.hash, password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    key = _fingerprint(plain_password, hashed_password)
+    now = time.monotonic()
+    if _verified.get(key, 0) > now:
+        return True
+    ok = await asyncio.get_running_loop().run_in_executor(
+        password_pool, pwd_context.verify, plain_password, hashed_password)
+    if ok:
+        if len(_verified) >= VERIFIED_CACHE_SIZE:
+            for stale in [k for k, expiry in _verified.items() if expiry <= now] or list(_verified)[:1]:
+                del _verified[stale]
+        _verified[key] = now + VERIFIED_CACHE_TTL
+    return ok
+
+
+def create_session_token(username: str, role: str) -> str:
+    expires = datetime.now(timezone.utc) + TOKEN_TTL
+    return jwt.encode({"sub": username, "role": role, "exp": expires}, SECRET_KEY, algorithm=TOKEN_ALGORITHM)
+
+
+def decode_session_token(token: str) -> Optional[dict]:
+    # claims of a valid, unexpired token, None otherwise
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[TOKEN_ALGORITHM])
+    except JWTError:
+        return None
@@ -0,0 +1,68 @@
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+# /auto_check latency with and without a concurrent burst of /login calls, against a
+# running backend:
+#   python bench_auth.py --url http://localhost:8000 --username admin
+# The burst uses a wrong password, so every call runs bcrypt (only successful checks are
+# cached). The gate path should keep the same p99 while bcrypt runs on the password pool.
+# Each /auto_check call checks the same test plate in or out, so the lot is left as it was;
+# start the backend with AUTO_CHECK_MIN_INTERVAL=0 so those calls are not skipped as duplicates.
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+async def gate_latencies(client, url, plate, count):
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        response = await client.post(f"{url}/auto_check", json={"license_plate": plate})
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+async def login_burst(client, url, username, concurrency, stop):
+    async def worker():
+        logins = 0
+        while not stop.is_set():
+            await client.post(f"{url}/login", params={"username": username, "password": "not-the-password"})
+            logins += 1
+        return logins
+    return sum(await asyncio.gather(*(worker() for _ in range(concurrency))))
+
+
+def report(name, latencies):
+    print(f"{name:>14}: n={len(latencies)} p50={statistics.median(latencies):.1f} ms "
+          f"p99={percentile(latencies, 0.99):.1f} ms max={max(latencies):.1f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Measure /auto_check latency during a login burst")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--plate", default="99A-99999", help="test plate, checked in and out alternately")
+    parser.add_argument("--requests", type=int, default=200, help="/auto_check calls per phase (even)")
+    parser.add_argument("--concurrency", type=int, default=16, help="parallel /login callers in the burst")
+    args = parser.parse_args()
+
+    async with httpx.AsyncClient(timeout=30) as client:
+        report("idle", await gate_latencies(client, args.url, args.plate, args.requests))
+        stop = asyncio.Event()
+        burst = asyncio.create_task(login_burst(
+            client, args.url, args.username, args.concurrency, stop))
+        await asyncio.sleep(0.5)
+        report("login burst", await gate_latencies(client, args.url, args.plate, args.requests))
+        stop.set()
+        print(f"{'logins':>14}: {await burst}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
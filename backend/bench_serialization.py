@@ -0,0 +1,59 @@
+import argparse
+import statistics
+import time
+from datetime import timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from models import StatusCode, now_vn
+from schemas import ParkingSessionPage, RowsResponse
+
+# Serialization time of a /get_all_parking_sessions body with N sessions, no database:
+#   python bench_serialization.py --sessions 100000
+# "before" is the old path (a dict of dicts through jsonable_encoder and json.dumps),
+# "response model" what FastAPI does for endpoints that return dicts under a
+# response_model (validate, then dump to JSON bytes with pydantic-core), "rows" the
+# RowsResponse used by the list endpoints (orjson straight from the row dicts).
+
+
+def session_rows(count):
+    start = now_vn() - timedelta(days=30)
+    return [{"id": i, "license_plate": f"{10 + i % 90}A-{10000 + i % 90000}", "vehicle_type": "car",
+             "time_in": start + timedelta(seconds=20 * i), "time_out": start + timedelta(seconds=20 * i + 3600),
+             "fee": 10.0, "status": "closed"} for i in range(count)]
+
+
+def measure(render, repeat):
+    times, size = [], 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = len(render())
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the JSON serialization of a session listing")
+    parser.add_argument("--sessions", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    body = {"status": StatusCode.SUCCESS, "message": "Lấy danh sách phiên đỗ xe thành công",
+            "sessions": session_rows(args.sessions), "next_cursor": None}
+    page = TypeAdapter(ParkingSessionPage)
+    paths = {
+        "before": lambda: JSONResponse(jsonable_encoder(body)).body,
+        "response model": lambda: page.dump_json(page.validate_python(body), exclude_unset=True),
+        "rows": lambda: RowsResponse(body).body,
+    }
+    baseline = None
+    for name, render in paths.items():
+        ms, size = measure(render, args.repeat)
+        baseline = baseline or ms
+        print(f"{name:>14}: {ms:8.1f} ms  {size / 1e6:6.1f} MB  x{baseline / ms:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,69 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-# Dùng async sqlite
-SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./database/database.db"
+# Engine settings come from the environment. SQLite (default) runs in WAL mode so the
+# dashboard reads do not block gate writes; for several uvicorn workers or hosts point
+# DATABASE_URL at PostgreSQL, e.g. postgresql+asyncpg://parking:parking@db:5432/parking
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./database/database.db")
+DB_ECHO = os.getenv("DB_ECHO", "0") == "1"  # log every SQL statement, for debugging only
+
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # safe with WAL, one fsync per checkpoint
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# connection pool for server databases, per worker process
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+
+def create_engine_from_url(url: str = SQLALCHEMY_DATABASE_URL):
+    if url.startswith("sqlite"):
+        db_engine = create_async_engine(url, echo=DB_ECHO,
+                                        connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000})
+
+        @event.listens_for(db_engine.sync_engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+            cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+            cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+            cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            cursor.close()
+
+        return db_engine
+    return create_async_engine(url, echo=DB_ECHO, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                               pool_timeout=DB_POOL_TIMEOUT, pool_recycle=DB_POOL_RECYCLE, pool_pre_ping=True)
+
+
+engine = create_engine_from_url()
+
+# SQLite allows one writer at a time and a waiting writer sleeps in the busy handler
+# while the lock holder may itself be waiting for the event loop; gate transactions
+# queue on this lock instead. Server databases lock rows and need no serialization.
+_write_lock = asyncio.Lock() if engine.dialect.name == "sqlite" else None
+
+
+def dialect_insert(table):
+    # INSERT with ON CONFLICT support; postgresql and sqlite share the API
+    return (postgresql.insert if engine.dialect.name == "postgresql" else sqlite.insert)(table)
+
 
-engine = create_async_engine(SQLALCHEMY_DATABASE_URL, echo=True)
+@asynccontextmanager
+async def serialized_writes():
+    if _write_lock is None:
+        yield
+        return
+    async with _write_lock:
+        yield
 
 async_session = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
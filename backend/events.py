@@ -0,0 +1,81 @@
+import asyncio
+import json
+import uuid
+from collections import deque
+from itertools import islice
+from typing import Optional
+
+EVENT_BUFFER_SIZE = 1000  # events kept for clients that reconnect
+KEEPALIVE_INTERVAL = 15  # seconds between SSE comments on an idle stream
+
+
+# In-process pub/sub for gate events, served as Server-Sent Events. Every event gets a
+# sequence number and is encoded once; subscribers read from a shared ring buffer, so
+# publishing costs the same however many clients are connected. A client resumes with
+# the id of the last event it saw ("<epoch>-<seq>", sent by EventSource as Last-Event-ID);
+# when that is from an older process or has left the buffer it gets a "reset" event and
+# reloads its state over the REST endpoints.
+class EventBus:
+    def __init__(self, json_default=None, buffer_size: int = EVENT_BUFFER_SIZE):
+        self.json_default = json_default
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self.buffer = deque(maxlen=buffer_size)  # (seq, encoded frame)
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+
+    def publish(self, event_type: str, data: dict):
+        self.seq += 1
+        self.buffer.append((self.seq, self._frame(self.seq, event_type, data)))
+        # wake every waiting subscriber, later ones wait on a fresh event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _frame(self, seq: int, event_type: str, data: dict) -> str:
+        payload = json.dumps(data, default=self.json_default, ensure_ascii=False)
+        return f"id: {self.epoch}-{seq}\nevent: {event_type}\ndata: {payload}\n\n"
+
+    def _resume_seq(self, last_event_id: Optional[str]) -> Optional[int]:
+        # sequence number to continue after, None when the client has to reload
+        if not last_event_id:
+            return self.seq
+        epoch, _, seq = last_event_id.partition("-")
+        if epoch != self.epoch or not seq.isdigit() or int(seq) > self.seq:
+            return None
+        seq = int(seq)
+        if seq < self.seq and (not self.buffer or self.buffer[0][0] > seq + 1):
+            return None
+        return seq
+
+    def _reset(self) -> str:
+        return self._frame(self.seq, "reset", {"epoch": self.epoch, "seq": self.seq})
+
+    async def stream(self, last_event_id: Optional[str] = None):
+        seq = self._resume_seq(last_event_id)
+        if seq is None:
+            yield self._reset()
+            seq = self.seq
+        self.subscribers += 1
+        try:
+            while True:
+                changed = self._changed
+                if seq < self.seq:
+                    first = self.buffer[0][0]
+                    if first > seq + 1:
+                        # too slow, missed events were evicted
+                        yield self._reset()
+                        seq = self.seq
+                        continue
+                    frames = [frame for _, frame in islice(self.buffer, seq + 1 - first, None)]
+                    seq = self.seq
+                    yield "".join(frames)
+                    continue
+                try:
+                    await asyncio.wait_for(changed.wait(), KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            self.subscribers -= 1
+
+    def stats(self) -> dict:
+        return {"epoch": self.epoch, "seq": self.seq, "buffered": len(self.buffer), "subscribers": self.subscribers}
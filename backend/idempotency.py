@@ -0,0 +1,55 @@
+import asyncio
+import json
+import os
+from datetime import timedelta
+from typing import Optional
+
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from database import async_session, dialect_insert
+from models import ProcessedEvent, now_vn
+
+# Idempotency keys of auto_check requests (the recognizer's event_id or an
+# Idempotency-Key header). A key is claimed in the same transaction as the check-in or
+# check-out it causes, so a retried or replayed request gets the first response back
+# instead of toggling the plate again. Keys are forgotten after IDEMPOTENCY_WINDOW.
+
+IDEMPOTENCY_WINDOW = timedelta(hours=int(os.getenv("IDEMPOTENCY_WINDOW_HOURS", "24")))
+PURGE_INTERVAL = 3600  # seconds between purges of expired keys
+
+
+async def claim_event(db: AsyncSession, event_id: str, license_plate: str) -> Optional[dict]:
+    # None when the key is new (and now taken), otherwise the stored response
+    result = await db.execute(dialect_insert(ProcessedEvent).values(
+        event_id=event_id, license_plate=license_plate, created_at=now_vn()
+    ).on_conflict_do_nothing(index_elements=["event_id"]).returning(ProcessedEvent.event_id))
+    if result.first():
+        return None
+    stored = await db.execute(select(ProcessedEvent.response).filter(ProcessedEvent.event_id == event_id))
+    return json.loads(stored.scalar() or "{}")
+
+
+async def store_event_response(db: AsyncSession, event_id: str, response: str):
+    await db.execute(update(ProcessedEvent).where(ProcessedEvent.event_id == event_id).values(response=response))
+
+
+async def release_event(db: AsyncSession, event_id: str):
+    await db.execute(delete(ProcessedEvent).where(ProcessedEvent.event_id == event_id))
+
+
+async def purge_processed_events(db: AsyncSession) -> int:
+    result = await db.execute(delete(ProcessedEvent).where(ProcessedEvent.created_at < now_vn() - IDEMPOTENCY_WINDOW))
+    return result.rowcount
+
+
+async def purge_periodically():
+    while True:
+        await asyncio.sleep(PURGE_INTERVAL)
+        try:
+            async with async_session() as db:
+                await purge_processed_events(db)
+                await db.commit()
+        except Exception as e:
+            print(f"Idempotency key purge failed: {e}")
@@ -1,26 +1,26 @@
 import asyncio
-import os
 from passlib.context import CryptContext
+from sqlalchemy.future import select
 
-from database import engine, async_session
-from models import Base, User, ParkingConfig, UserRole, VehicleType
+from database import async_session
+from migrations import migrate
+from models import User, ParkingConfig, UserRole, VehicleType
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-DB_PATH = "/app/database/database.db"  # đường dẫn tuyệt đối trong container
-
 
 async def init_db():
-    db_exists = os.path.exists(DB_PATH)
+    # Create or upgrade the schema (SQLite file or the server in DATABASE_URL)
+    await migrate()
 
-    # Nếu chưa có file database, tạo mới và khởi tạo dữ liệu
-    if not db_exists:
-        print("Database not found. Creating new database...")
+    # Nếu database chưa có người dùng nào, khởi tạo dữ liệu mặc định
+    async with async_session() as session:
+        result = await session.execute(select(User.id).limit(1))
+        db_exists = result.first() is not None
 
-        # Create tables
-        async with engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
+    if not db_exists:
+        print("Database is empty. Creating default data...")
 
         # Create admin user and default configs
         async with async_session() as session:
@@ -33,13 +33,11 @@ async def init_db():
             session.add(admin)
 
             car_config = ParkingConfig(
-                id=1,
                 vehicle_type=VehicleType.CAR,
                 max_capacity=50,
                 price_per_hour=10.0
             )
             motorcycle_config = ParkingConfig(
-                id=2,
                 vehicle_type=VehicleType.MOTORCYCLE,
                 max_capacity=100,
                 price_per_hour=5.0
@@ -52,7 +50,7 @@ async def init_db():
 
         print("✅ Database created with admin user and default configs.")
     else:
-        print("✅ Database already exists. Skipping initialization.")
+        print("✅ Database already initialized. Skipping default data.")
 
 if __name__ == "__main__":
     asyncio.run(init_db())
@@ -0,0 +1,150 @@
+import argparse
+import asyncio
+import re
+from datetime import datetime
+
+from sqlalchemy import text
+
+from database import engine
+from models import Base, ParkingSession, ParkingStatsDaily, ParkingStatsHourly, ProcessedEvent, SessionArchive
+from stats import rebuild_rollups_sync
+
+# Schema migrations, applied in order and recorded in schema_migrations.
+# Each entry is (version, description, statements); a statement is either SQL text
+# or a callable run against the sync connection. Never edit an applied migration,
+# add a new one instead.
+
+
+def _create_tables(conn):
+    # baseline: every table in models.py that does not exist yet
+    Base.metadata.create_all(conn)
+
+
+def _create_stats_rollups(conn):
+    for table in (ParkingStatsHourly, ParkingStatsDaily):
+        table.__table__.create(conn, checkfirst=True)
+    # backfill from the existing history, one pass over parking_sessions
+    rebuild_rollups_sync(conn)
+
+
+def _unique_active_plate(conn):
+    # before the constraint existed a plate could be checked in twice; keep the oldest
+    # active session and close the duplicates as zero-length, zero-fee stays
+    conn.execute(text(
+        "UPDATE parking_sessions SET status = 'closed', time_out = time_in, fee = 0 "
+        "WHERE status = 'active' AND id NOT IN ("
+        "SELECT min(id) FROM parking_sessions WHERE status = 'active' GROUP BY license_plate)"))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_parking_sessions_active_plate "
+        "ON parking_sessions (license_plate) WHERE status = 'active'"))
+    ProcessedEvent.__table__.create(conn, checkfirst=True)
+    # the closed duplicates count as check-outs
+    rebuild_rollups_sync(conn)
+
+
+def _create_session_archives(conn):
+    # the monthly archive tables themselves are created by archive.py when first needed
+    SessionArchive.__table__.create(conn, checkfirst=True)
+
+
+MIGRATIONS = [
+    (1, "baseline tables", [_create_tables]),
+    (2, "parking_sessions hot-path indexes", [
+        "CREATE INDEX IF NOT EXISTS ix_parking_sessions_plate_status "
+        "ON parking_sessions (license_plate, status)",
+        "CREATE INDEX IF NOT EXISTS ix_parking_sessions_plate_time_in "
+        "ON parking_sessions (license_plate, time_in)",
+        "CREATE INDEX IF NOT EXISTS ix_parking_sessions_active "
+        "ON parking_sessions (license_plate, vehicle_type) WHERE status = 'active'",
+    ]),
+    (3, "parking_sessions keyset pagination index", [
+        "CREATE INDEX IF NOT EXISTS ix_parking_sessions_time_in_id "
+        "ON parking_sessions (time_in, id)",
+    ]),
+    (4, "hourly and daily stats rollups", [_create_stats_rollups]),
+    (5, "one active session per plate, auto_check idempotency keys", [_unique_active_plate]),
+    (6, "registry of monthly session archives", [_create_session_archives]),
+]
+
+PLAN_PLATE = "30F-55775"
+
+
+def hot_queries():
+    # The statements api.py runs on the gate path and for the history page, built by the
+    # same functions; each must reach parking_sessions through an index search (SEARCH),
+    # a scan, even in index order, reads the whole table. Imported here because api.py
+    # imports this module.
+    from api import (active_session_query, current_state_query, last_time_out_query, latest_session_query,
+                     sessions_query)
+    filters = dict(date_from=None, date_to=None, plate_prefix=None, vehicle_type=None, status=None)
+    return {
+        "active session by plate (auto_check, update_parking_session)": active_session_query(PLAN_PLATE),
+        "current state of a plate (duplicate auto_check)": current_state_query(PLAN_PLATE),
+        "latest time_out of a plate (auto_check check-in)": last_time_out_query(PLAN_PLATE),
+        "latest session by plate (get_parking_session)": latest_session_query(PLAN_PLATE),
+        "session history page (get_all_parking_sessions)": sessions_query(
+            [ParkingSession.__table__], filters, (datetime(2025, 1, 1), 1), 101),
+    }
+
+
+async def applied_versions(conn):
+    await conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, description VARCHAR, applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"))
+    result = await conn.execute(text("SELECT version FROM schema_migrations"))
+    return {row[0] for row in result}
+
+
+async def migrate(db_engine=engine):
+    async with db_engine.begin() as conn:
+        done = await applied_versions(conn)
+    for version, description, statements in MIGRATIONS:
+        if version in done:
+            continue
+        # one transaction per migration, so a failure leaves the previous version intact
+        async with db_engine.begin() as conn:
+            for statement in statements:
+                if callable(statement):
+                    await conn.run_sync(statement)
+                else:
+                    await conn.execute(text(statement))
+            await conn.execute(text(
+                "INSERT INTO schema_migrations (version, description) VALUES (:version, :description)"),
+                {"version": version, "description": description})
+        print(f"✅ Applied migration {version}: {description}")
+
+
+async def check_query_plans(db_engine=engine):
+    # EXPLAIN QUERY PLAN (SQLite) for every hot query, returns the ones that do not
+    # search parking_sessions by index
+    failures = []
+    if db_engine.dialect.name != "sqlite":
+        print(f"Query plan check only supports SQLite, skipped for {db_engine.dialect.name}")
+        return failures
+    async with db_engine.connect() as conn:
+        for name, statement in hot_queries().items():
+            compiled = statement.compile(dialect=db_engine.dialect)
+            params = compiled.construct_params()
+            result = await conn.exec_driver_sql(
+                "EXPLAIN QUERY PLAN " + str(compiled), tuple(params[key] for key in compiled.positiontup))
+            plan = [row[-1] for row in result]
+            steps = [step for step in plan if re.search(r"\bparking_sessions\b", step)]
+            ok = bool(steps) and all(step.startswith("SEARCH") for step in steps)
+            print(f"{'✅' if ok else '❌'} {name}: {' | '.join(plan)}")
+            if not ok:
+                failures.append(name)
+    return failures
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations")
+    parser.add_argument("--check-plans", action="store_true",
+                        help="fail if a hot query does not search parking_sessions by index")
+    args = parser.parse_args()
+    await migrate()
+    if args.check_plans and await check_query_plans():
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
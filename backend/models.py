@@ -1,11 +1,13 @@
-from sqlalchemy import Boolean, Column, Integer, String, DateTime, Float, Enum
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, Date, Float, Text, Enum, Index, literal_column
 from sqlalchemy.ext.declarative import declarative_base
 import enum
 from datetime import datetime, timedelta, timezone
 
 
 def now_vn():
-    return datetime.now(timezone(timedelta(hours=7)))
+    # naive local time, as stored: SQLite drops the offset and asyncpg rejects aware values
+    # for TIMESTAMP WITHOUT TIME ZONE columns
+    return datetime.now(timezone(timedelta(hours=7))).replace(tzinfo=None)
 
 
 Base = declarative_base()
@@ -59,3 +61,64 @@ class ParkingSession(Base):
     fee = Column(Float, nullable=True)
     status = Column(String, default="active")  # active, closed
     created_at = Column(DateTime, default=now_vn)
+
+    # kept in step with migrations 2, 3 and 5 in migrations.py
+    __table_args__ = (
+        Index("ix_parking_sessions_plate_status", "license_plate", "status"),
+        Index("ix_parking_sessions_plate_time_in", "license_plate", "time_in"),
+        Index("ix_parking_sessions_active", "license_plate", "vehicle_type",
+              sqlite_where=literal_column("status = 'active'"),
+              postgresql_where=literal_column("status = 'active'")),
+        Index("ix_parking_sessions_time_in_id", "time_in", "id"),
+        # at most one active session per plate, concurrent check-ins of the same car conflict here
+        Index("ux_parking_sessions_active_plate", "license_plate", unique=True,
+              sqlite_where=literal_column("status = 'active'"),
+              postgresql_where=literal_column("status = 'active'")),
+    )
+
+
+class ParkingOccupancy(Base):
+    # number of active sessions per vehicle type, kept in step with parking_sessions
+    __tablename__ = "parking_occupancy"
+    vehicle_type = Column(String, primary_key=True)
+    active_count = Column(Integer, default=0, nullable=False)
+
+
+class ProcessedEvent(Base):
+    # auto_check requests already applied, by idempotency key, with the response they got
+    __tablename__ = "processed_events"
+    event_id = Column(String, primary_key=True)
+    license_plate = Column(String)
+    response = Column(Text)
+    created_at = Column(DateTime, default=now_vn, index=True)
+
+
+class SessionArchive(Base):
+    # one row per archive table of closed sessions (archive.py), by month of time_in
+    __tablename__ = "session_archives"
+    month = Column(String, primary_key=True)  # YYYY-MM
+    table_name = Column(String, nullable=False)
+    row_count = Column(Integer, default=0, nullable=False)
+    archived_at = Column(DateTime, default=now_vn, onupdate=now_vn)
+
+
+class ParkingStatsHourly(Base):
+    # rollup per hour and vehicle type: check-ins by time_in, check-outs, revenue and dwell by time_out
+    __tablename__ = "parking_stats_hourly"
+    bucket = Column(DateTime, primary_key=True)  # start of the hour, local time
+    vehicle_type = Column(String, primary_key=True)
+    checkins = Column(Integer, default=0, nullable=False)
+    checkouts = Column(Integer, default=0, nullable=False)
+    revenue = Column(Float, default=0.0, nullable=False)
+    dwell_seconds = Column(Float, default=0.0, nullable=False)
+
+
+class ParkingStatsDaily(Base):
+    # same counters as ParkingStatsHourly, per day
+    __tablename__ = "parking_stats_daily"
+    bucket = Column(Date, primary_key=True)
+    vehicle_type = Column(String, primary_key=True)
+    checkins = Column(Integer, default=0, nullable=False)
+    checkouts = Column(Integer, default=0, nullable=False)
+    revenue = Column(Float, default=0.0, nullable=False)
+    dwell_seconds = Column(Float, default=0.0, nullable=False)
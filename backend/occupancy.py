@@ -0,0 +1,130 @@
+import asyncio
+import os
+import time
+from typing import NamedTuple, Optional
+
+from sqlalchemy import func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from database import async_session, dialect_insert, engine, serialized_writes
+from models import ParkingConfig, ParkingOccupancy, ParkingSession
+
+RECONCILE_INTERVAL = 3600  # seconds between rebuilds of the counters from parking_sessions
+# seconds a cached ParkingConfig is trusted: a config changed through another worker or
+# process is only seen by this one when its entry expires
+CONFIG_CACHE_TTL = float(os.getenv("CONFIG_CACHE_TTL", "30"))
+
+
+class CachedConfig(NamedTuple):
+    id: int
+    vehicle_type: str
+    max_capacity: int
+    price_per_hour: float
+
+
+def _type_key(vehicle_type) -> str:
+    # VehicleType members and the plain strings stored in the table must hit the same entry
+    return getattr(vehicle_type, "value", vehicle_type)
+
+
+# (expiry, ParkingConfig row) by vehicle type, cleared whenever a config is created, updated
+# or deleted here and expired after CONFIG_CACHE_TTL for changes made by other workers
+_config_cache = {}
+
+
+async def get_cached_config(db: AsyncSession, vehicle_type: str) -> Optional[CachedConfig]:
+    vehicle_type = _type_key(vehicle_type)
+    entry = _config_cache.get(vehicle_type)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+    result = await db.execute(select(ParkingConfig).filter(ParkingConfig.vehicle_type == vehicle_type))
+    row = result.scalars().first()
+    if not row:
+        _config_cache.pop(vehicle_type, None)
+        return None
+    config = CachedConfig(row.id, row.vehicle_type, row.max_capacity, row.price_per_hour)
+    _config_cache[vehicle_type] = (time.monotonic() + CONFIG_CACHE_TTL, config)
+    return config
+
+
+def invalidate_config_cache():
+    _config_cache.clear()
+
+
+# Occupancy counters. Callers run these inside the same transaction as the session
+# change and commit both together.
+
+
+async def reserve_slot(db: AsyncSession, vehicle_type: str, max_capacity: int) -> bool:
+    # capacity check and increment in one statement
+    for _ in range(2):
+        result = await db.execute(update(ParkingOccupancy).where(
+            ParkingOccupancy.vehicle_type == vehicle_type,
+            ParkingOccupancy.active_count < max_capacity
+        ).values(active_count=ParkingOccupancy.active_count + 1))
+        if result.rowcount:
+            return True
+        exists = await db.execute(select(ParkingOccupancy.vehicle_type).filter(
+            ParkingOccupancy.vehicle_type == vehicle_type))
+        if exists.first():
+            return False
+        # first session of a vehicle type added after the last reconciliation
+        await reconcile_occupancy(db, [vehicle_type])
+    return False
+
+
+async def release_slot(db: AsyncSession, vehicle_type: str):
+    await db.execute(update(ParkingOccupancy).where(
+        ParkingOccupancy.vehicle_type == vehicle_type,
+        ParkingOccupancy.active_count > 0
+    ).values(active_count=ParkingOccupancy.active_count - 1))
+
+
+async def reconcile_occupancy(db: AsyncSession, vehicle_types=None):
+    # rebuild the counters from parking_sessions, for all known types unless given. The
+    # count and the write are one UPDATE, and no check-in or check-out may commit in
+    # between: the caller holds serialized_writes() (SQLite), the counter rows are
+    # locked first on PostgreSQL
+    if vehicle_types is None:
+        active = await db.execute(select(ParkingSession.vehicle_type).filter(
+            ParkingSession.status == "active").distinct())
+        configured = await db.execute(select(ParkingConfig.vehicle_type))
+        vehicle_types = {t for t in [*active.scalars().all(), *configured.scalars().all()] if t}
+        counters = []
+    else:
+        vehicle_types = {_type_key(t) for t in vehicle_types}
+        counters = [ParkingOccupancy.vehicle_type.in_(sorted(vehicle_types))]
+    if vehicle_types:
+        await db.execute(dialect_insert(ParkingOccupancy).values(
+            [{"vehicle_type": t, "active_count": 0} for t in sorted(vehicle_types)]
+        ).on_conflict_do_nothing(index_elements=["vehicle_type"]))
+    if engine.dialect.name == "postgresql":
+        await db.execute(select(ParkingOccupancy.vehicle_type).where(*counters).with_for_update())
+    active_count = select(func.count(ParkingSession.id)).where(
+        ParkingSession.status == "active",
+        ParkingSession.vehicle_type == ParkingOccupancy.vehicle_type).scalar_subquery()
+    await db.execute(update(ParkingOccupancy).where(*counters).values(
+        active_count=active_count).execution_options(synchronize_session=False))
+
+
+async def resync_occupancy(db: AsyncSession):
+    # reconcile_occupancy as a transaction of its own, outside the gate path
+    async with serialized_writes():
+        await reconcile_occupancy(db)
+        await db.commit()
+
+
+async def get_occupancy(db: AsyncSession):
+    result = await db.execute(select(ParkingOccupancy))
+    return {row.vehicle_type: row.active_count for row in result.scalars().all()}
+
+
+async def reconcile_periodically():
+    while True:
+        await asyncio.sleep(RECONCILE_INTERVAL)
+        try:
+            async with async_session() as db:
+                await resync_occupancy(db)
+        except Exception as e:
+            print(f"Occupancy reconciliation failed: {e}")
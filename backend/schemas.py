@@ -0,0 +1,153 @@
+from datetime import date, datetime
+from typing import Dict, List, Optional, Union
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from models import StatusCode
+
+# Response models of the API. Every response carries status and message; the other
+# fields are only present on success, so routes are declared with
+# response_model_exclude_unset=True and an error dict validates against any of them.
+# FastAPI serializes these straight to JSON bytes through pydantic-core.
+
+
+class StatusResponse(BaseModel):
+    status: StatusCode
+    message: str
+
+
+class UserInfo(BaseModel):
+    username: str
+    email: Optional[str] = None
+    role: str
+    is_active: Optional[bool] = None
+    created_at: Optional[datetime] = None
+
+
+class UserResponse(StatusResponse):
+    user: Optional[UserInfo] = None
+
+
+class LoginResponse(UserResponse):
+    token: Optional[str] = None
+
+
+class UserListResponse(StatusResponse):
+    users: Optional[List[UserInfo]] = None
+
+
+class ParkingConfigInfo(BaseModel):
+    id: int
+    vehicle_type: str
+    max_capacity: int
+    price_per_hour: float
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class ParkingConfigListResponse(StatusResponse):
+    config: Optional[List[ParkingConfigInfo]] = None
+
+
+class ParkingSessionResult(StatusResponse):
+    license_plate: Optional[str] = None
+    vehicle_type: Optional[str] = None
+    time_in: Optional[datetime] = None
+    time_out: Optional[datetime] = None
+    fee: Optional[float] = None
+
+
+class GateEventBatchResponse(StatusResponse):
+    # one entry per event, in request order: a ParkingSessionResult or an error
+    results: Optional[List[ParkingSessionResult]] = None
+
+
+class ParkingSessionInfo(BaseModel):
+    license_plate: str
+    vehicle_type: str
+    time_in: Optional[datetime] = None
+    time_out: Optional[datetime] = None
+    fee: Optional[float] = None
+    status: str
+
+
+class ParkingSessionResponse(StatusResponse):
+    session: Optional[ParkingSessionInfo] = None
+
+
+class ParkingSessionRow(ParkingSessionInfo):
+    id: int
+
+
+class ParkingSessionPage(StatusResponse):
+    sessions: Optional[List[ParkingSessionRow]] = None
+    next_cursor: Optional[str] = None
+
+
+class ArchiveResponse(StatusResponse):
+    archived: Optional[Dict[str, int]] = None  # sessions moved per month, YYYY-MM
+
+
+class OccupancyResponse(StatusResponse):
+    occupancy: Optional[Dict[str, int]] = None
+
+
+class OccupancyInfo(BaseModel):
+    active: int
+    max_capacity: Optional[int] = None
+
+
+class StatsOccupancyResponse(StatusResponse):
+    occupancy: Optional[Dict[str, OccupancyInfo]] = None
+
+
+class EventStreamResponse(StatusResponse):
+    epoch: Optional[str] = None
+    seq: Optional[int] = None
+    buffered: Optional[int] = None
+    subscribers: Optional[int] = None
+
+
+class StatsTotals(BaseModel):
+    checkins: int
+    checkouts: int
+    revenue: float
+    avg_dwell_seconds: Optional[float] = None
+
+
+class StatsSummaryResponse(StatusResponse):
+    total: Optional[StatsTotals] = None
+    by_vehicle_type: Optional[Dict[str, StatsTotals]] = None
+
+
+class StatsBucket(BaseModel):
+    bucket: Union[datetime, date]  # start of the hour, the day or the month
+    checkins: int
+    checkouts: int
+    revenue: float
+    avg_dwell_seconds: Optional[float] = None
+
+
+class StatsSeriesResponse(StatusResponse):
+    series: Optional[List[StatsBucket]] = None
+
+
+class PeakHour(BaseModel):
+    hour: int
+    checkins: int
+    checkouts: int
+
+
+class PeakHoursResponse(StatusResponse):
+    hours: Optional[List[PeakHour]] = None
+
+
+class RowsResponse(JSONResponse):
+    # For list endpoints that return Core rows as they come from the database: orjson
+    # renders the dicts directly, skipping the per-item validation of the response model
+    # (which then only documents the shape). Datetimes come out in ISO 8601 as with pydantic.
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=str)
@@ -0,0 +1,176 @@
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, extract, func, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from archive import archive_tables_sync
+from database import dialect_insert
+from models import ParkingSession, ParkingStatsDaily, ParkingStatsHourly, now_vn
+
+# Hourly and daily rollups of parking_sessions. Check-ins are counted in the bucket of
+# time_in, check-outs, revenue and dwell time in the bucket of time_out. Callers run the
+# record_* helpers inside the same transaction as the session change, like the
+# occupancy counters.
+
+COUNTERS = ("checkins", "checkouts", "revenue", "dwell_seconds")
+GRANULARITIES = ("hour", "day", "month")
+DEFAULT_RANGE_DAYS = 30
+REBUILD_CHUNK_SIZE = 5000
+
+
+def _buckets(moment: datetime):
+    moment = moment.replace(tzinfo=None)
+    return ((ParkingStatsHourly, moment.replace(minute=0, second=0, microsecond=0)),
+            (ParkingStatsDaily, moment.date()))
+
+
+def _upsert(table, bucket, vehicle_type, deltas: dict):
+    stmt = dialect_insert(table).values(
+        bucket=bucket, vehicle_type=vehicle_type, **{name: deltas.get(name, 0) for name in COUNTERS})
+    return stmt.on_conflict_do_update(
+        index_elements=["bucket", "vehicle_type"],
+        set_={name: getattr(table, name) + stmt.excluded[name] for name in deltas})
+
+
+async def record_checkin(db: AsyncSession, vehicle_type: str, time_in: datetime):
+    for table, bucket in _buckets(time_in):
+        await db.execute(_upsert(table, bucket, vehicle_type, {"checkins": 1}))
+
+
+async def record_checkout(db: AsyncSession, vehicle_type: str, time_in: datetime, time_out: datetime,
+                          fee: Optional[float]):
+    deltas = {"checkouts": 1, "revenue": fee or 0.0,
+              "dwell_seconds": (time_out.replace(tzinfo=None) - time_in.replace(tzinfo=None)).total_seconds()}
+    for table, bucket in _buckets(time_out):
+        await db.execute(_upsert(table, bucket, vehicle_type, deltas))
+
+
+def aggregate_sessions(rows):
+    # (vehicle_type, time_in, time_out, fee) rows -> {table: [row values]} for both rollups
+    totals = {}
+
+    def bump(moment, vehicle_type, deltas):
+        for table, bucket in _buckets(moment):
+            counters = totals.setdefault((table, bucket, vehicle_type), dict.fromkeys(COUNTERS, 0))
+            for name, value in deltas.items():
+                counters[name] += value
+
+    for vehicle_type, time_in, time_out, fee in rows:
+        if time_in:
+            bump(time_in, vehicle_type, {"checkins": 1})
+        if time_in and time_out:
+            bump(time_out, vehicle_type, {"checkouts": 1, "revenue": fee or 0.0,
+                                          "dwell_seconds": (time_out - time_in).total_seconds()})
+    result = {ParkingStatsHourly: [], ParkingStatsDaily: []}
+    for (table, bucket, vehicle_type), counters in totals.items():
+        result[table].append({"bucket": bucket, "vehicle_type": vehicle_type, **counters})
+    return result
+
+
+SESSION_FIELDS = (ParkingSession.vehicle_type, ParkingSession.time_in, ParkingSession.time_out, ParkingSession.fee)
+
+
+def _all_sessions(conn):
+    # parking_sessions and every archive month
+    yield from conn.execute(select(*SESSION_FIELDS).execution_options(yield_per=REBUILD_CHUNK_SIZE))
+    for table in archive_tables_sync(conn):
+        yield from conn.execute(select(table.c.vehicle_type, table.c.time_in, table.c.time_out, table.c.fee)
+                                .execution_options(yield_per=REBUILD_CHUNK_SIZE))
+
+
+def rebuild_rollups_sync(conn):
+    # full rebuild from parking_sessions and its archives on a sync connection (migrations)
+    for table in (ParkingStatsHourly, ParkingStatsDaily):
+        conn.execute(delete(table))
+    for table, values in aggregate_sessions(_all_sessions(conn)).items():
+        if values:
+            conn.execute(insert(table), values)
+
+
+async def rebuild_rollups(db: AsyncSession):
+    # after manual edits or deletions of sessions, which do not touch the rollups
+    await db.run_sync(lambda session: rebuild_rollups_sync(session.connection()))
+
+
+# Queries for the /stats endpoints. Ranges are inclusive local dates and default to the
+# last DEFAULT_RANGE_DAYS days; the cost depends on the range, not on the history size.
+
+
+def date_range(date_from: Optional[date], date_to: Optional[date]):
+    date_to = date_to or now_vn().date()
+    date_from = date_from or date_to - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    return date_from, date_to
+
+
+def _range_filter(table, date_from: date, date_to: date):
+    if table is ParkingStatsHourly:
+        return (table.bucket >= datetime.combine(date_from, time.min),
+                table.bucket < datetime.combine(date_to + timedelta(days=1), time.min))
+    return table.bucket >= date_from, table.bucket <= date_to
+
+
+def _sums(table):
+    return (func.sum(table.checkins).label("checkins"), func.sum(table.checkouts).label("checkouts"),
+            func.sum(table.revenue).label("revenue"), func.sum(table.dwell_seconds).label("dwell_seconds"))
+
+
+def _counters(row) -> dict:
+    return {name: getattr(row, name) or 0 for name in COUNTERS}
+
+
+def _totals(counters: dict) -> dict:
+    checkouts = counters["checkouts"]
+    return {
+        "checkins": counters["checkins"],
+        "checkouts": checkouts,
+        "revenue": counters["revenue"],
+        "avg_dwell_seconds": counters["dwell_seconds"] / checkouts if checkouts else None,
+    }
+
+
+async def get_summary(db: AsyncSession, date_from: Optional[date] = None, date_to: Optional[date] = None):
+    # totals per vehicle type and overall from the daily rollup, all time unless a range is given
+    query = select(ParkingStatsDaily.vehicle_type, *_sums(ParkingStatsDaily)).group_by(ParkingStatsDaily.vehicle_type)
+    if date_from or date_to:
+        query = query.where(*_range_filter(ParkingStatsDaily, *date_range(date_from, date_to)))
+    by_type = {row.vehicle_type: _counters(row) for row in (await db.execute(query)).all()}
+    total = {name: sum(counters[name] for counters in by_type.values()) for name in COUNTERS}
+    return {"total": _totals(total),
+            "by_vehicle_type": {vehicle_type: _totals(counters) for vehicle_type, counters in by_type.items()}}
+
+
+async def get_series(db: AsyncSession, granularity: str, date_from: Optional[date] = None,
+                     date_to: Optional[date] = None, vehicle_type: Optional[str] = None):
+    date_from, date_to = date_range(date_from, date_to)
+    table = ParkingStatsHourly if granularity == "hour" else ParkingStatsDaily
+    query = select(table.bucket, *_sums(table)).where(*_range_filter(table, date_from, date_to))
+    if vehicle_type:
+        query = query.where(table.vehicle_type == vehicle_type)
+    rows = (await db.execute(query.group_by(table.bucket).order_by(table.bucket))).all()
+    if granularity != "month":
+        return [{"bucket": row.bucket, **_totals(_counters(row))} for row in rows]
+    # a few hundred daily rows per year, folded here to stay dialect-neutral
+    months = {}
+    for row in rows:
+        counters = months.setdefault(row.bucket.replace(day=1), dict.fromkeys(COUNTERS, 0))
+        for name, value in _counters(row).items():
+            counters[name] += value
+    return [{"bucket": bucket, **_totals(counters)} for bucket, counters in months.items()]
+
+
+async def get_peak_hours(db: AsyncSession, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                         vehicle_type: Optional[str] = None):
+    # check-ins and check-outs per hour of day over the range, 24 entries
+    date_from, date_to = date_range(date_from, date_to)
+    table = ParkingStatsHourly
+    hour = extract("hour", table.bucket)
+    query = select(hour, func.sum(table.checkins), func.sum(table.checkouts)).where(
+        *_range_filter(table, date_from, date_to))
+    if vehicle_type:
+        query = query.where(table.vehicle_type == vehicle_type)
+    counts = {int(h): (checkins or 0, checkouts or 0)
+              for h, checkins, checkouts in (await db.execute(query.group_by(hour))).all()}
+    return [{"hour": h, "checkins": counts.get(h, (0, 0))[0], "checkouts": counts.get(h, (0, 0))[1]}
+            for h in range(24)]
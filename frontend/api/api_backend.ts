@@ -22,6 +22,14 @@ export async function login(username: string, password: string) {
     return res.json();
 }
 
+// Checks the token returned by login, without sending the password again
+export async function getSession(token: string) {
+    const res = await fetch(`${API_BASE}/session`, {
+        headers: { Authorization: `Bearer ${token}` },
+    });
+    return res.json();
+}
+
 export async function modifyUserInfo(username: string, data: {
     password?: string;
     role?: string;
@@ -109,11 +117,84 @@ export async function getParkingSession(license_plate: string) {
     return res.json();
 }
 
-export async function getAllParkingSessions() {
-    const res = await fetch(`${API_BASE}/get_all_parking_sessions`);
+export type ParkingSessionFilters = {
+    date_from?: string;
+    date_to?: string;
+    plate_prefix?: string;
+    vehicle_type?: string;
+    status?: string;
+};
+
+function sessionQuery(params: Record<string, string | number | undefined>) {
+    const query = new URLSearchParams();
+    Object.entries(params).forEach(([key, value]) => {
+        if (value !== undefined && value !== "") query.set(key, String(value));
+    });
+    return query.toString();
+}
+
+// One page, newest first; pass the returned next_cursor to get the following page
+export async function getParkingSessions(params: ParkingSessionFilters & { limit?: number; cursor?: string } = {}) {
+    const res = await fetch(`${API_BASE}/get_all_parking_sessions?${sessionQuery(params)}`);
+    return res.json();
+}
+
+// Walks every page; prefer getParkingSessions with filters for large histories
+export async function getAllParkingSessions(filters: ParkingSessionFilters = {}) {
+    const sessions: any[] = [];
+    let cursor: string | undefined;
+    do {
+        const page = await getParkingSessions({ ...filters, limit: 1000, cursor });
+        if (page.status !== "success") return page;
+        sessions.push(...page.sessions);
+        cursor = page.next_cursor ?? undefined;
+    } while (cursor);
+    return { status: "success", sessions };
+}
+
+export async function getStatsSummary(params: { date_from?: string; date_to?: string } = {}) {
+    const res = await fetch(`${API_BASE}/stats/summary?${sessionQuery(params)}`);
+    return res.json();
+}
+
+export async function getStatsOccupancy() {
+    const res = await fetch(`${API_BASE}/stats/occupancy`);
+    return res.json();
+}
+
+export async function getStatsSeries(params: {
+    granularity?: "hour" | "day" | "month";
+    date_from?: string;
+    date_to?: string;
+    vehicle_type?: string;
+} = {}) {
+    const res = await fetch(`${API_BASE}/stats/series?${sessionQuery(params)}`);
     return res.json();
 }
 
+export async function getStatsPeakHours(params: { date_from?: string; date_to?: string; vehicle_type?: string } = {}) {
+    const res = await fetch(`${API_BASE}/stats/peak_hours?${sessionQuery(params)}`);
+    return res.json();
+}
+
+// Live check-in/check-out events. EventSource reconnects on its own and resumes after the
+// last event it saw; onReset means events were missed and the caller should reload.
+export function subscribeParkingEvents(handlers: {
+    onCheckin?: (session: any) => void;
+    onCheckout?: (session: any) => void;
+    onReset?: () => void;
+}) {
+    const source = new EventSource(`${API_BASE}/events`);
+    source.addEventListener("checkin", (e) => handlers.onCheckin?.(JSON.parse((e as MessageEvent).data)));
+    source.addEventListener("checkout", (e) => handlers.onCheckout?.(JSON.parse((e as MessageEvent).data)));
+    source.addEventListener("reset", () => handlers.onReset?.());
+    return () => source.close();
+}
+
+export function exportParkingSessionsUrl(filters: ParkingSessionFilters = {}) {
+    return `${API_BASE}/export_parking_sessions?${sessionQuery(filters)}`;
+}
+
 export async function updateParkingSession(license_plate: string, data: {
     status?: string;
     timeout?: string;
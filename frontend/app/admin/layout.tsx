@@ -6,6 +6,7 @@ import type React from "react"
 import { useEffect, useState } from "react"
 import { useRouter } from "next/navigation"
 import AdminSidebar from "@/components/admin-sidebar"
+import { getSession } from "@/api/api_backend"
 
 export default function AdminLayout({
   children,
@@ -28,8 +29,17 @@ export default function AdminLayout({
       router.replace("/login")
       return
     }
-    setUser(userObj)
-    setLoading(false)
+    // The role in the cookie is only trusted while the signed session token is valid
+    getSession(Cookies.get("token") ?? "").then((res) => {
+      if (res.status !== "success" || res.user.role !== "admin") {
+        Cookies.remove("user")
+        Cookies.remove("token")
+        router.replace("/login")
+        return
+      }
+      setUser(userObj)
+      setLoading(false)
+    })
   }, [router])
 
   if (loading) return null
@@ -26,6 +26,22 @@ type LogEntry = {
 }
 
 const PAGE_SIZE = 50
+const SESSION_LOG_LIMIT = 1000
+
+function sessionLog(s: any): LogEntry {
+  return {
+    id: `session-${s.id}`,
+    timestamp: s.time_in ? new Date(s.time_in).toISOString() : "",
+    action: s.status === "closed" ? "Thanh toán & xuất bãi" : "Nhận diện biển số",
+    user: s.license_plate || "",
+    details:
+      s.status === "closed"
+        ? `Thanh toán và xuất bãi thành công${s.license_plate ? ` (Biển số: ${s.license_plate})` : ""}`
+        : `Nhận diện biển số xe thành công${s.license_plate ? ` (Biển số: ${s.license_plate})` : ""}`,
+    level: "info",
+    licensePlate: s.license_plate,
+  }
+}
 
 export default function LogsPage() {
   const { toast } = useToast()
@@ -43,21 +59,11 @@ export default function LogsPage() {
   const fetchLogs = async () => {
     setLoading(true)
     // Get parking sessions (info)
-    const sessionRes = await api.getAllParkingSessions()
+    // Latest sessions only, the full history can be downloaded from /export_parking_sessions
+    const sessionRes = await api.getParkingSessions({ limit: SESSION_LOG_LIMIT })
     let sessionLogs: LogEntry[] = []
     if (sessionRes.status === "success" && Array.isArray(sessionRes.sessions)) {
-      sessionLogs = sessionRes.sessions.map((s: any) => ({
-        id: `session-${s.id}`,
-        timestamp: s.time_in ? new Date(s.time_in).toISOString() : "",
-        action: s.status === "closed" ? "Thanh toán & xuất bãi" : "Nhận diện biển số",
-        user: s.license_plate || "",
-        details:
-          s.status === "closed"
-            ? `Thanh toán và xuất bãi thành công${s.license_plate ? ` (Biển số: ${s.license_plate})` : ""}`
-            : `Nhận diện biển số xe thành công${s.license_plate ? ` (Biển số: ${s.license_plate})` : ""}`,
-        level: "info" as const,
-        licensePlate: s.license_plate,
-      }))
+      sessionLogs = sessionRes.sessions.map(sessionLog)
     }
 
     // Get parking config (warning)
@@ -116,6 +122,13 @@ export default function LogsPage() {
 
   useEffect(() => {
     fetchLogs()
+    // Apply gate events as they happen instead of reloading the lists
+    const upsert = (s: any) => {
+      const entry = sessionLog(s)
+      setLogs((prev) => [entry, ...prev.filter((log) => log.id !== entry.id)].sort(
+        (a, b) => new Date(b.timestamp).getTime() - new Date(a.timestamp).getTime()))
+    }
+    return api.subscribeParkingEvents({ onCheckin: upsert, onCheckout: upsert, onReset: fetchLogs })
   }, [])
 
   // Filter logs by date (dd/mm/yyyy) and level
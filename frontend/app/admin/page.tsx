@@ -13,9 +13,12 @@ import {
   Tooltip,
   ResponsiveContainer,
 } from "recharts"
+import { format } from "date-fns"
 import {
   getAllUsers,
-  getAllParkingSessions,
+  getStatsSummary,
+  getStatsSeries,
+  subscribeParkingEvents,
 } from "@/api/api_backend"
 
 export default function AdminDashboard() {
@@ -32,42 +35,43 @@ export default function AdminDashboard() {
       const usersRes = await getAllUsers()
       setUserCount(usersRes?.users?.length ?? 0)
 
-      // Get parking sessions
-      const sessionsRes = await getAllParkingSessions()
-      const sessions = sessionsRes?.sessions ?? []
-
-      setVehicleCount(sessions.length)
-
-      // Revenue: sum all session.fee
-      let totalRevenue = 0
-      sessions.forEach((s: any) => {
-        if (typeof s.fee === "number") totalRevenue += s.fee
-      })
-      setRevenue(totalRevenue)
+      // Totals and monthly counts come from the server-side rollups
+      const now = new Date()
+      const first = new Date(now.getFullYear(), now.getMonth() - 11, 1)
+      const [summaryRes, seriesRes] = await Promise.all([
+        getStatsSummary(),
+        getStatsSeries({ granularity: "month", date_from: format(first, "yyyy-MM-dd"), date_to: format(now, "yyyy-MM-dd") }),
+      ])
+      setVehicleCount(summaryRes?.total?.checkins ?? 0)
+      setRevenue(summaryRes?.total?.revenue ?? 0)
 
-      // Monthly stats: count vehicles per month
+      // Monthly stats: vehicles per month, last 12 months
       const months: { [key: string]: number } = {}
-      sessions.forEach((s: any) => {
-        if (!s.time_in) return
-        const date = new Date(s.time_in)
-        const key = `${date.getFullYear()}-${date.getMonth() + 1}`
-        months[key] = (months[key] || 0) + 1
-      })
-      // Get last 12 months
-      const now = new Date()
+      for (const m of seriesRes?.series ?? []) {
+        months[m.bucket.slice(0, 7)] = m.checkins
+      }
       const stats: any[] = []
       for (let i = 11; i >= 0; i--) {
         const d = new Date(now.getFullYear(), now.getMonth() - i, 1)
-        const key = `${d.getFullYear()}-${d.getMonth() + 1}`
         stats.push({
           name: `T${d.getMonth() + 1}`,
-          count: months[key] || 0,
+          count: months[format(d, "yyyy-MM")] || 0,
         })
       }
       setMonthlyStats(stats)
       setLoading(false)
     }
     fetchData()
+    // Live updates from gate events; the current month is the last bar of the chart
+    return subscribeParkingEvents({
+      onCheckin: () => {
+        setVehicleCount((count) => (count ?? 0) + 1)
+        setMonthlyStats((stats) =>
+          stats.map((m, i) => (i === stats.length - 1 ? { ...m, count: m.count + 1 } : m)))
+      },
+      onCheckout: (session) => setRevenue((total) => (total ?? 0) + (session.fee ?? 0)),
+      onReset: fetchData,
+    })
   }, [])
 
   return (
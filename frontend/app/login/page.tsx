@@ -41,6 +41,7 @@ export default function LoginPage() {
       } else {
         // Save user info to cookie
         Cookies.set("user", JSON.stringify(res.user), { expires: 7 })
+        Cookies.set("token", res.token, { expires: 7 })
         // Redirect by role
         if (res.user.role === "admin") {
           router.replace("/admin")
@@ -21,6 +21,22 @@ interface PlateInfo {
 const API_BASE_URL = "http://localhost:8001";
 const WS_URL = API_BASE_URL.replace(/^http/, 'ws') + "/ws/stream";
 
+// Binary frame: version, lane id length, capture timestamp (s), sequence number, then JPEG bytes.
+// The lane id is left empty so the server uses the lane from the URL.
+const FRAME_HEADER_SIZE = 14;
+
+async function encodeFrame(blob: Blob, seq: number): Promise<ArrayBuffer> {
+    const jpeg = new Uint8Array(await blob.arrayBuffer());
+    const buf = new ArrayBuffer(FRAME_HEADER_SIZE + jpeg.length);
+    const view = new DataView(buf);
+    view.setUint8(0, 1);
+    view.setUint8(1, 0);
+    view.setFloat64(2, Date.now() / 1000);
+    view.setUint32(10, seq >>> 0);
+    new Uint8Array(buf, FRAME_HEADER_SIZE).set(jpeg);
+    return buf;
+}
+
 export default function UserPage() {
     const [plateInfo, setPlateInfo] = useState<PlateInfo>({ plate: "No plate detected", boxes: [] });
     const [showServerFeed, setShowServerFeed] = useState(true);
@@ -37,6 +53,8 @@ export default function UserPage() {
     const wsRef = useRef<WebSocket | null>(null);
     const heartbeatRef = useRef<NodeJS.Timeout | null>(null);
     const retryTimeoutRef = useRef<NodeJS.Timeout | null>(null);
+    const frameSeqRef = useRef(0);
+    const sendIntervalRef = useRef(40);
 
     // Poll server for latest plate regardless of feed
     useEffect(() => {
@@ -97,7 +115,10 @@ export default function UserPage() {
         ws.onmessage = evt => {
             try {
                 const data = JSON.parse(evt.data);
-                if (data.status === 'no_active_feed') {
+                if (data.type === 'ack') {
+                    // server hint: frames sent faster than it can process are dropped anyway
+                    sendIntervalRef.current = Math.max(40, data.min_interval_ms || 0);
+                } else if (data.status === 'no_active_feed') {
                     setCameraError('No active server feed');
                 } else if (data.plate) {
                     setPlateInfo({ plate: data.plate, boxes: data.boxes || [] });
@@ -165,10 +186,13 @@ export default function UserPage() {
             }
             if (ws.readyState === WebSocket.OPEN && video.videoWidth) {
                 ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
-                ws.send(canvas.toDataURL('image/jpeg', 0.7));
+                canvas.toBlob(async blob => {
+                    if (!blob || ws.readyState !== WebSocket.OPEN) return;
+                    ws.send(await encodeFrame(blob, frameSeqRef.current++));
+                }, 'image/jpeg', 0.7);
                 setCameraError(null);
             }
-            if (ws.readyState === WebSocket.OPEN) setTimeout(loop, 40);
+            if (ws.readyState === WebSocket.OPEN) setTimeout(loop, sendIntervalRef.current);
         };
         loop();
     };
@@ -59,6 +59,7 @@ export default function Navbar() {
                 <DropdownMenuItem
                   onClick={() => {
                     Cookies.remove("user")
+                    Cookies.remove("token")
                     window.location.href = "/login"
                   }}
                   className="flex items-center gap-2"
@@ -0,0 +1,273 @@
+import argparse
+import collections
+import csv
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import function.helper as helper
+from webcam_api import LicensePlateRecognizer, PlateModels, settings
+
+# End-to-end benchmark of LicensePlateRecognizer.process on recorded gate footage, offline on CPU:
+#   python bench_recognizer.py --source data/gate_clips --truth data/gate_clips.csv --report bench.json
+#   python bench_recognizer.py --source data/gate_clips --truth data/gate_clips.csv --baseline bench.json
+# Every video file and every directory of frames under --source is one clip, replayed through a
+# fresh recognizer with the frame timestamps (video fps, or --fps for frames) as its clock, so
+# sessions open and close the same way however fast the machine is. The truth CSV has a
+# clip,plate row per vehicle expected to pass in the clip (clip = path relative to --source).
+# Reported: frames/s of process(), per-frame latency percentiles of its stages (motion, detect,
+# deskew, ocr, and post = the rest: session bookkeeping, drawing, stream publish) and of the
+# finer stages of function/metrics.py they are made of, exact match of the plates the
+# recognizer sends to /auto_check against the truth, and the peak RSS.
+# The service settings apply (environment variables as for webcam_api), e.g. INFERENCE_BACKEND.
+# With --baseline the run is compared to an earlier report and exits 1 on a regression.
+
+IMG_FORMATS = ('.bmp', '.jpeg', '.jpg', '.png', '.tif', '.tiff', '.webp')
+VID_FORMATS = ('.avi', '.m4v', '.mkv', '.mov', '.mp4', '.mpeg', '.mpg', '.ts', '.wmv')
+STAGES = ('motion', 'detect', 'deskew', 'ocr', 'post', 'total')
+# stage of the report -> prefixes of the recognizer's stage names it sums
+STAGE_GROUPS = {'motion': ('motion',), 'detect': ('detect_',), 'deskew': ('deskew_',), 'ocr': ('ocr_', 'assemble')}
+
+
+# stands in for the EventDispatcher, keeps the plates the recognizer would send to /auto_check
+class CollectedEvents:
+    def __init__(self):
+        self.plates = []
+
+    def submit(self, event):
+        self.plates.append(event["license_plate"])
+
+
+# observe() target of the recognizer: stage times of the current frame are summed (a frame
+# can run several OCR and deskew passes) and stored as one sample per stage when it ends
+class StageTimes:
+    def __init__(self):
+        self.samples = collections.defaultdict(list)
+        self.detail = collections.defaultdict(list)
+        self.frame = collections.Counter()
+
+    def __call__(self, stage, seconds):
+        self.frame[stage] += seconds
+
+    def end_frame(self, total):
+        groups = collections.Counter()
+        for stage, seconds in self.frame.items():
+            self.detail[stage].append(seconds)
+            group = next((g for g, prefixes in STAGE_GROUPS.items() if stage.startswith(prefixes)), 'post')
+            groups[group] += seconds
+        for group, seconds in groups.items():
+            if group != 'post':
+                self.samples[group].append(seconds)
+        self.samples['post'].append(total - sum(self.frame.values()) + groups['post'])
+        self.samples['total'].append(total)
+        self.frame.clear()
+
+    @staticmethod
+    def _summary(samples, stages):
+        out = {}
+        for stage in stages:
+            ms = np.array(samples[stage]) * 1000
+            if len(ms):
+                p50, p90, p99 = np.percentile(ms, (50, 90, 99))
+                out[stage] = {'frames': len(ms), 'mean_ms': float(ms.mean()), 'p50_ms': float(p50),
+                              'p90_ms': float(p90), 'p99_ms': float(p99), 'max_ms': float(ms.max())}
+        return out
+
+    def summary(self):
+        return self._summary(self.samples, STAGES)
+
+    def detail_summary(self):
+        return self._summary(self.detail, sorted(self.detail))
+
+
+def find_clips(source):
+    clips = []
+    for root, dirs, files in os.walk(source):
+        dirs.sort()
+        files = sorted(files)
+        if any(f.lower().endswith(IMG_FORMATS) for f in files):
+            clips.append(os.path.relpath(root, source))
+        clips += [os.path.relpath(os.path.join(root, f), source) for f in files if f.lower().endswith(VID_FORMATS)]
+    return clips
+
+
+def read_clip(path, fps):
+    # (timestamp in seconds, BGR frame) in capture order
+    if os.path.isdir(path):
+        files = sorted(f for f in os.listdir(path) if f.lower().endswith(IMG_FORMATS))
+        for i, f in enumerate(files):
+            yield i / fps, cv2.imread(os.path.join(path, f))
+        return
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or fps
+    i = 0
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        yield i / fps, frame
+        i += 1
+    cap.release()
+
+
+def read_truth(path):
+    truth = collections.defaultdict(list)
+    if path:
+        with open(path, newline='') as f:
+            for row in csv.reader(f):
+                if row and row[0] != 'clip':
+                    truth[os.path.normpath(row[0])].append(row[1])
+    return truth
+
+
+def run_clip(models, path, fps, times):
+    events = CollectedEvents()
+    recognizer = LicensePlateRecognizer(settings, models, events, os.path.basename(path))
+    frames, busy, now, frame = 0, 0.0, 0.0, None
+    for now, frame in read_clip(path, fps):
+        recognizer.observe = times
+        start = time.perf_counter()
+        recognizer.process(frame, now)
+        elapsed = time.perf_counter() - start
+        times.end_frame(elapsed)
+        frames += 1
+        busy += elapsed
+    if frame is not None:
+        # the last frame held still until the session the clip ends in closes (the motion
+        # background absorbs it within a few frames), untimed
+        recognizer.observe = None
+        for _ in range(int(60 * fps)):
+            if not recognizer.session_active:
+                break
+            now += 1 / fps
+            recognizer.process(frame.copy(), now)
+    return frames, busy, events.plates
+
+
+def match(expected, read):
+    # plates of the clip read exactly, each expected plate matched at most once
+    left = collections.Counter(helper.normalize_plate(p) for p in read)
+    correct = 0
+    for plate in expected:
+        if left[helper.normalize_plate(plate)] > 0:
+            left[helper.normalize_plate(plate)] -= 1
+            correct += 1
+    return correct
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    versions = {}
+    for name in ('torch', 'onnxruntime', 'cv2', 'numpy'):
+        module = sys.modules.get(name)
+        versions[name] = getattr(module, '__version__', None)
+    return {'commit': commit, 'python': platform.python_version(), 'machine': platform.processor() or platform.machine(),
+            'cpu_count': os.cpu_count(), 'versions': versions}
+
+
+def compare(report, baseline, max_slowdown, max_accuracy_drop):
+    # prints the change against the baseline report, returns the regressions found
+    regressions = []
+    fps, old_fps = report['fps'], baseline['fps']
+    print(f"vs baseline {baseline['environment'].get('commit')}: {old_fps:.1f} -> {fps:.1f} frames/s")
+    for stage in STAGES:
+        new, old = report['stages'].get(stage), baseline['stages'].get(stage)
+        if new and old:
+            print(f"  {stage:>7} p50 {old['p50_ms']:8.2f} -> {new['p50_ms']:8.2f} ms   "
+                  f"p99 {old['p99_ms']:8.2f} -> {new['p99_ms']:8.2f} ms")
+    if fps < old_fps * (1 - max_slowdown):
+        regressions.append(f"frames/s {old_fps:.1f} -> {fps:.1f}")
+    accuracy, old_accuracy = report['accuracy']['exact_match'], baseline['accuracy']['exact_match']
+    if accuracy is not None and old_accuracy is not None:
+        print(f"  exact match {old_accuracy:.3f} -> {accuracy:.3f}")
+        if accuracy < old_accuracy - max_accuracy_drop:
+            regressions.append(f"exact match {old_accuracy:.3f} -> {accuracy:.3f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded gate footage through the plate recognizer")
+    parser.add_argument('--source', required=True, help='directory of videos and/or frame directories')
+    parser.add_argument('--truth', help='CSV of clip,plate rows')
+    parser.add_argument('--fps', type=float, default=10.0, help='capture rate of frame directories')
+    parser.add_argument('--report', default='bench_recognizer.json')
+    parser.add_argument('--baseline', help='earlier report to compare against')
+    parser.add_argument('--max-slowdown', type=float, default=0.1, help='allowed frames/s drop, as a fraction')
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.0)
+    args = parser.parse_args()
+
+    clips = find_clips(args.source)
+    if not clips:
+        sys.exit(f"No videos or frames under {args.source}")
+    truth = read_truth(args.truth)
+    models = PlateModels(settings)
+    models.load()
+    # first forwards allocate buffers and build grids, keep them out of the numbers
+    warmup = np.zeros((settings.standard_height, settings.standard_width, 3), np.uint8)
+    models.detect(warmup)
+    models.ocr(warmup[:64, :192])
+
+    times = StageTimes()
+    results, total_frames, total_busy = {}, 0, 0.0
+    for clip in clips:
+        frames, busy, plates = run_clip(models, os.path.join(args.source, clip), args.fps, times)
+        expected = truth.get(os.path.normpath(clip), [])
+        results[clip] = {'frames': frames, 'fps': frames / busy if busy else None, 'expected': expected,
+                         'read': plates, 'correct': match(expected, plates)}
+        total_frames += frames
+        total_busy += busy
+        print(f"{clip}: {frames} frames, read {plates or '-'}, expected {expected or '-'}")
+
+    expected_total = sum(len(r['expected']) for r in results.values())
+    correct_total = sum(r['correct'] for r in results.values())
+    report = {
+        'environment': environment(),
+        'backend': models.backend,
+        'settings': settings.model_dump(),
+        'frames': total_frames,
+        'fps': total_frames / total_busy if total_busy else 0.0,
+        'stages': times.summary(),
+        'detail': times.detail_summary(),
+        'accuracy': {'expected': expected_total, 'correct': correct_total,
+                     'exact_match': correct_total / expected_total if expected_total else None,
+                     'extra_reads': sum(len(r['read']) for r in results.values()) - correct_total},
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,  # KiB on Linux
+        'clips': results,
+    }
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{total_frames} frames, {report['fps']:.1f} frames/s, backend {models.backend}, "
+          f"peak RSS {report['peak_rss_mb']:.0f} MB")
+    for section in ('stages', 'detail'):
+        for stage, s in report[section].items():
+            print(f"{stage:>17}: {s['frames']:6d} frames  p50 {s['p50_ms']:8.2f}  p90 {s['p90_ms']:8.2f}  "
+                  f"p99 {s['p99_ms']:8.2f}  max {s['max_ms']:8.2f} ms")
+        print()
+    accuracy = report['accuracy']
+    if accuracy['expected']:
+        print(f"exact match {accuracy['correct']}/{accuracy['expected']} ({accuracy['exact_match']:.3f}), "
+              f"{accuracy['extra_reads']} extra reads")
+    print(f"Report written to {args.report}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.max_slowdown, args.max_accuracy_drop)
+        if regressions:
+            print("Regression: " + "; ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
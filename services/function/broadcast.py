@@ -0,0 +1,81 @@
+import asyncio
+import collections
+import threading
+
+import cv2
+
+
+# MJPEG fan-out for one lane: each published frame is JPEG-encoded once per quality
+# tier that has viewers, and every viewer of that tier gets the same bytes
+class FrameHub:
+    def __init__(self, frame, tiers):
+        self.tiers = tiers  # name -> (jpeg quality, output width, 0 keeps the frame width)
+        self.lock = threading.Lock()
+        self.frame = frame
+        self.seq = 0
+        self.cache = {}  # tier -> (seq, jpeg bytes)
+        self.subscribers = collections.Counter()
+        self.loop = None
+        self.event = asyncio.Event()
+
+    def bind(self, loop):
+        self.loop = loop
+
+    def _encode(self, frame, tier):
+        quality, width = self.tiers[tier]
+        h, w = frame.shape[:2]
+        if width and width != w:
+            frame = cv2.resize(frame, (width, h * width // w), interpolation=cv2.INTER_AREA)
+        return cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+    def _store(self, tier, seq, buf):
+        with self.lock:
+            if self.cache.get(tier, (-1, None))[0] < seq:
+                self.cache[tier] = (seq, buf)
+            return self.cache[tier]
+
+    def publish(self, frame):
+        # called from the lane's inference worker, encodes only tiers someone is watching
+        with self.lock:
+            self.seq += 1
+            self.frame = frame
+            seq = self.seq
+            tiers = [t for t, n in self.subscribers.items() if n > 0]
+        for tier in tiers:
+            self._store(tier, seq, self._encode(frame, tier))
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        event, self.event = self.event, asyncio.Event()
+        event.set()
+
+    def latest(self, tier):
+        with self.lock:
+            seq, frame = self.seq, self.frame
+            cached = self.cache.get(tier)
+        if cached is not None and cached[0] == seq:
+            return cached
+        return self._store(tier, seq, self._encode(frame, tier))
+
+    async def stream(self, tier):
+        with self.lock:
+            self.subscribers[tier] += 1
+        try:
+            last = -1
+            while True:
+                event = self.event
+                with self.lock:
+                    cached = self.cache.get(tier)
+                    stale = cached is None or cached[0] != self.seq
+                if stale:
+                    # first viewer of this tier since the last publish
+                    cached = await asyncio.to_thread(self.latest, tier)
+                seq, buf = cached
+                if seq != last:
+                    last = seq
+                    yield b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + buf + b'\r\n'
+                await event.wait()
+        finally:
+            with self.lock:
+                self.subscribers[tier] -= 1
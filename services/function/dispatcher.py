@@ -0,0 +1,200 @@
+import asyncio
+import collections
+import json
+import os
+import time
+import uuid
+
+import httpx
+
+from function import metrics
+
+# client errors the backend answers for an event it will never accept (malformed, conflicting);
+# retrying them cannot help, so they are dropped. Any other status is retried and then spooled
+NON_RETRYABLE = {400, 409, 422}
+
+
+# delivers plate events to the backend off the frame-processing path: a bounded queue
+# feeds one pooled async client, failed events are retried with backoff and then
+# spooled to an append-only JSON-lines file that is replayed once the backend is back.
+# While the spool holds anything, new events are appended behind it so the backend
+# always sees check-ins and check-outs in order.
+class EventDispatcher:
+    def __init__(self, url, spool_path, queue_size=1000, max_retries=5, backoff=0.5,
+                 timeout=5.0, replay_interval=10.0, replay_batch=500):
+        self.url = url
+        self.spool_path = spool_path
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.replay_interval = replay_interval
+        self.replay_batch = replay_batch  # spooled events per /auto_check/batch request
+        self.loop = None
+        self.queue = None
+        self.client = None
+        self.tasks = []
+        self.inflight = None
+        self.delivered = 0
+        self.failed_attempts = 0
+        self.spooled = 0
+        self.replayed = 0
+        self.latencies = collections.deque(maxlen=1000)  # seconds from event creation to delivery
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(self.queue_size)
+        self.client = httpx.AsyncClient(timeout=self.timeout)
+        self.tasks = [asyncio.create_task(self._run()), asyncio.create_task(self._replay_loop())]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        # the event being retried and whatever is still queued survive the restart in the spool
+        if self.inflight is not None:
+            self._spool(self.inflight, first=True)
+            self.inflight = None
+        while self.queue is not None and not self.queue.empty():
+            self._spool(self.queue.get_nowait())
+        if self.client is not None:
+            await self.client.aclose()
+
+    def submit(self, payload):
+        # thread-safe, called from lane workers
+        event = dict(payload, event_id=uuid.uuid4().hex, timestamp=time.time())
+        if self.loop is None:
+            self._spool(event)
+        else:
+            self.loop.call_soon_threadsafe(self._enqueue, event)
+        return event
+
+    def _enqueue(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # overflow: everything queued goes to the spool first so order is kept
+            while not self.queue.empty():
+                self._spool(self.queue.get_nowait())
+            self._spool(event)
+
+    def _spool(self, event, first=False):
+        os.makedirs(os.path.dirname(self.spool_path) or ".", exist_ok=True)
+        line = json.dumps(event) + "\n"
+        if first and self._spool_pending():
+            # the in-flight event is older than anything spooled while it was retried
+            with open(self.spool_path) as f:
+                rest = f.read()
+            tmp = self.spool_path + ".tmp"
+            with open(tmp, "w") as f:
+                f.write(line + rest)
+            os.replace(tmp, self.spool_path)
+        else:
+            with open(self.spool_path, "a") as f:
+                f.write(line)
+        self.spooled += 1
+        metrics.auto_check_event(event, "spooled")
+
+    def _spool_pending(self):
+        return os.path.exists(self.spool_path) and os.path.getsize(self.spool_path) > 0
+
+    async def _post(self, event):
+        try:
+            r = await self.client.post(self.url, json=event)
+            if r.is_success:
+                self.delivered += 1
+                self.latencies.append(time.time() - event["timestamp"])
+                metrics.auto_check_event(event, "delivered", self.latencies[-1])
+                return True
+            if r.status_code in NON_RETRYABLE:
+                print(f"auto_check rejected {event['license_plate']}: HTTP {r.status_code}")
+                metrics.auto_check_event(event, "rejected")
+                return True
+        except httpx.HTTPError as e:
+            print(f"Failed to call auto_check API: {e}")
+        self.failed_attempts += 1
+        metrics.auto_check_event(event, "failed")
+        return False
+
+    async def _post_batch(self, events):
+        try:
+            r = await self.client.post(self.url + "/batch", json={"events": events})
+            if r.status_code in NON_RETRYABLE:
+                # one bad event refuses the whole batch: send them one by one so only it is dropped
+                for event in events:
+                    if not await self._post(event):
+                        return False
+                return True
+            if r.is_success:
+                self.delivered += len(events)
+                now = time.time()
+                self.latencies.extend(now - event["timestamp"] for event in events)
+                for event in events:
+                    metrics.auto_check_event(event, "delivered", now - event["timestamp"])
+                return True
+        except httpx.HTTPError as e:
+            print(f"Failed to call auto_check batch API: {e}")
+        self.failed_attempts += 1
+        for event in events:
+            metrics.auto_check_event(event, "failed")
+        return False
+
+    async def _deliver(self, event, retries):
+        for attempt in range(retries + 1):
+            if await self._post(event):
+                return True
+            if attempt < retries:
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+        return False
+
+    async def _run(self):
+        while True:
+            event = await self.queue.get()
+            if self._spool_pending():
+                self._spool(event)
+                continue
+            # left set when stop() cancels the delivery, stop() then spools it
+            self.inflight = event
+            if not await self._deliver(event, self.max_retries):
+                self._spool(event, first=True)
+            self.inflight = None
+
+    async def _replay_loop(self):
+        while True:
+            await asyncio.sleep(self.replay_interval)
+            if self.inflight is None and self._spool_pending():
+                await self._replay()
+
+    async def _replay(self):
+        # the backend applies a batch in event-time order, in one transaction
+        with open(self.spool_path) as f:
+            events = [json.loads(line) for line in f if line.strip()]
+        sent = 0
+        while sent < len(events):
+            chunk = events[sent:sent + self.replay_batch]
+            if not await self._post_batch(chunk):
+                break
+            sent += len(chunk)
+        self.replayed += sent
+        # drop the delivered head, keeping anything appended while replaying
+        with open(self.spool_path) as f:
+            lines = [line for line in f if line.strip()]
+        tmp = self.spool_path + ".tmp"
+        with open(tmp, "w") as f:
+            f.writelines(lines[sent:])
+        os.replace(tmp, self.spool_path)
+
+    def stats(self):
+        lat = sorted(self.latencies)
+        pct = lambda p: 1000 * lat[min(len(lat) - 1, int(p * len(lat)))] if lat else 0.0
+        return {
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "delivered": self.delivered,
+            "failed_attempts": self.failed_attempts,
+            "spooled": self.spooled,
+            "replayed": self.replayed,
+            "spool_pending": self._spool_pending(),
+            "latency_p50_ms": pct(0.5),
+            "latency_p99_ms": pct(0.99),
+            "latency_max_ms": 1000 * lat[-1] if lat else 0.0,
+        }
@@ -1,64 +1,104 @@
-import math
+import re
+import numpy as np
+import function.utils_rotate as utils_rotate
+from function.timing import detections_timed, timed
 
-# license plate type classification helper function
-def linear_equation(x1, y1, x2, y2):
-    b = y1 - (y2 - y1) * x1 / (x2 - x1)
-    a = (y1 - b) / x1
-    return a, b
+MAX_TILT = np.tan(np.radians(30))  # steepest plate slope considered when splitting 2 line plates
 
-def check_point_linear(x, y, x1, y1, x2, y2):
-    a, b = linear_equation(x1, y1, x2, y2)
-    y_pred = a*x+b
-    return(math.isclose(y_pred, y, abs_tol = 3))
+# assemble the plate from character detections (n, 6) [xmin, ymin, xmax, ymax, confidence, class],
+# returns the plate string and per-character confidences in reading order
+def assemble_plate(pred, names, line_tol=3):
+    pred = pred.cpu().numpy() if hasattr(pred, 'cpu') else np.asarray(pred)
+    if len(pred) < 7 or len(pred) > 10:
+        return "unknown", np.zeros(0, np.float32)
+    x_c = (pred[:, 0] + pred[:, 2]) / 2
+    y_c = (pred[:, 1] + pred[:, 3]) / 2
+
+    # 1 line plates fit a single least-squares line, 2 line plates leave centres far off it
+    line = np.zeros(len(pred), np.int64)
+    if np.ptp(x_c) > 0:
+        A = np.stack([x_c, np.ones_like(x_c)], 1)
+        coef = np.linalg.lstsq(A, y_c, rcond=None)[0]
+        residual = y_c - A @ coef
+        if np.abs(residual).max() > line_tol:
+            # rows of unequal length tilt that line, so the residual sign can put a character of
+            # one row in the other. Any 2 characters of a row give the plate slope instead: of the
+            # pairwise slopes up to 30 degrees, take the one that flattens both rows (the gap between
+            # the de-trended heights is then nearly all of their spread) and split the rows there
+            i, j = np.triu_indices(len(pred), 1)
+            dx, dy = x_c[j] - x_c[i], y_c[j] - y_c[i]
+            keep = (np.abs(dy) <= MAX_TILT * np.abs(dx)) & (dx != 0)  # same-centre boxes give no slope
+            slopes = np.append(dy[keep] / dx[keep], coef[0])
+            heights = np.sort(y_c[None, :] - slopes[:, None] * x_c[None, :], axis=1)
+            gaps = np.diff(heights, axis=1)
+            best = np.argmax(gaps.max(1) / np.ptp(heights, axis=1))
+            split = heights[best, np.argmax(gaps[best])]
+            line = (y_c - slopes[best] * x_c > split).astype(np.int64)
+
+    order = np.lexsort((x_c, line))
+    chars = [str(names[int(c)]) for c in pred[order, 5]]
+    if line.any():
+        n1 = len(pred) - int(line.sum())
+        license_plate = "".join(chars[:n1]) + "-" + "".join(chars[n1:])
+    else:
+        license_plate = "".join(chars)
+    return license_plate, pred[order, 4]
 
 # detect character and number in license plate
 def read_plate(yolo_license_plate, im):
-    LP_type = "1"
     results = yolo_license_plate(im)
-    bb_list = results.pandas().xyxy[0].values.tolist()
-    if len(bb_list) == 0 or len(bb_list) < 7 or len(bb_list) > 10:
-        return "unknown"
-    center_list = []
-    y_mean = 0
-    y_sum = 0
-    for bb in bb_list:
-        x_c = (bb[0]+bb[2])/2
-        y_c = (bb[1]+bb[3])/2
-        y_sum += y_c
-        center_list.append([x_c,y_c,bb[-1]])
+    return assemble_plate(results.pred[0], results.names)[0]
 
-    # find 2 point to draw line
-    l_point = center_list[0]
-    r_point = center_list[0]
-    for cp in center_list:
-        if cp[0] < l_point[0]:
-            l_point = cp
-        if cp[0] > r_point[0]:
-            r_point = cp
-    for ct in center_list:
-        if l_point[0] != r_point[0]:
-            if (check_point_linear(ct[0], ct[1], l_point[0], l_point[1], r_point[0], r_point[1]) == False):
-                LP_type = "2"
+# detect characters on several plate images with one batched forward,
+# AutoShape letterboxes the whole list into a single tensor.
+# returns (plate, per-character confidences) per image
+def read_plates(yolo_license_plate, imgs, observe=None):
+    if len(imgs) == 0:
+        return []
+    results = detections_timed(observe, "ocr", lambda: yolo_license_plate(list(imgs)))
+    with timed(observe, "assemble"):
+        return [assemble_plate(pred, results.names) for pred in results.pred]
 
-    y_mean = int(int(y_sum) / len(bb_list))
-    size = results.pandas().s
+# mean character confidence of a read, 0 for unknown plates
+def plate_confidence(license_plate, confs):
+    return float(confs.mean()) if license_plate != "unknown" and len(confs) else 0.0
 
-    # 1 line plates and 2 line plates
-    line_1 = []
-    line_2 = []
-    license_plate = ""
-    if LP_type == "2":
-        for c in center_list:
-            if int(c[1]) > y_mean:
-                line_2.append(c)
-            else:
-                line_1.append(c)
-        for l1 in sorted(line_1, key = lambda x: x[0]):
-            license_plate += str(l1[2])
-        license_plate += "-"
-        for l2 in sorted(line_2, key = lambda x: x[0]):
-            license_plate += str(l2[2])
-    else:
-        for l in sorted(center_list, key = lambda x: x[0]):
-            license_plate += str(l[2])
-    return license_plate
\ No newline at end of file
+# staged reading: the crop as-is (or rotated by a known angle) first, CLAHE/Hough
+# deskew variants only for crops whose read is missing or below accept_conf.
+# returns (plate, confidence, skew angle) per image
+# observe(stage, seconds) times the deskew, ocr and assemble stages (see function/metrics.py)
+def read_plates_staged(yolo_license_plate, imgs, accept_conf, angles=None, observe=None):
+    angles = list(angles) if angles is not None else [None] * len(imgs)
+    with timed(observe if any(angles) else None, "deskew_tracked"):
+        first = [img if not a else utils_rotate.rotate_image(img, a) for img, a in zip(imgs, angles)]
+    reads = read_plates(yolo_license_plate, first, observe)
+    best = [(txt, plate_confidence(txt, confs), angles[i] or 0.0) for i, (txt, confs) in enumerate(reads)]
+    pending = [i for i in range(len(imgs)) if best[i][1] < accept_conf]
+    for cc in range(2):
+        for ct in range(2):
+            if not pending:
+                return best
+            with timed(observe, f"deskew_cc{cc}_ct{ct}"):
+                rot = [utils_rotate.deskew_angle(imgs[i], cc, ct) for i in pending]
+                rotated = [utils_rotate.rotate_image(imgs[i], a) for i, a in zip(pending, rot)]
+            texts = read_plates(yolo_license_plate, rotated, observe)
+            for i, a, (txt, confs) in zip(pending, rot, texts):
+                conf = plate_confidence(txt, confs)
+                if conf > best[i][1]:
+                    best[i] = (txt, conf, a)
+            pending = [i for i in pending if best[i][1] < accept_conf]
+    return best
+
+# IoU of 2 boxes [x1, y1, x2, y2]
+def box_iou(b1, b2):
+    xa, ya = max(b1[0], b2[0]), max(b1[1], b2[1])
+    xb, yb = min(b1[2], b2[2]), min(b1[3], b2[3])
+    if xb <= xa or yb <= ya:
+        return 0.0
+    inter = (xb - xa) * (yb - ya)
+    union = (b1[2] - b1[0]) * (b1[3] - b1[1]) + (b2[2] - b2[0]) * (b2[3] - b2[1]) - inter
+    return inter / float(union)
+
+# plate text reduced to digits and capital letters, to compare reads with ground truth
+def normalize_plate(license_plate):
+    return re.sub(r'[^0-9A-Z]', '', license_plate.upper())
@@ -0,0 +1,61 @@
+from prometheus_client import Counter, Histogram
+
+# Prometheus metrics of the recognizer service, served by /metrics in webcam_api.
+# Stage names (label "stage" of recognizer_stage_seconds), disjoint so they add up to
+# the frame time:
+#   decode                                  JPEG / data URL to BGR frame
+#   motion                                  motion gate (function/motion.py)
+#   detect_wait, detect_preprocess,         detector call: batcher wait, letterbox,
+#   detect_forward, detect_nms              forward of the whole batch, NMS
+#   deskew_tracked                          rotation by the skew angle kept from the last frame
+#   deskew_cc{0,1}_ct{0,1}                  Hough deskew variants (CLAHE, center threshold)
+#   ocr_wait, ocr_preprocess,               OCR call: model lock wait, letterbox,
+#   ocr_forward, ocr_nms                    forward, NMS
+#   assemble                                characters to plate strings
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+STAGE_SECONDS = Histogram("recognizer_stage_seconds", "Time per frame hot-path stage",
+                          ["lane", "stage"], buckets=LATENCY_BUCKETS)
+FRAME_SECONDS = Histogram("recognizer_frame_seconds", "Time to process one frame, decode excluded",
+                          ["lane"], buckets=LATENCY_BUCKETS)
+FRAMES_RECEIVED = Counter("recognizer_frames_received", "Frames received from the camera client", ["lane"])
+FRAMES_DROPPED = Counter("recognizer_frames_dropped", "Frames replaced by a newer one before processing",
+                         ["lane"])
+FRAMES_PROCESSED = Counter("recognizer_frames_processed", "Frames processed", ["lane"])
+FRAMES_FAILED = Counter("recognizer_frames_failed", "Frames that failed to decode or process", ["lane"])
+SESSIONS_OPENED = Counter("recognizer_sessions_opened", "Motion sessions opened", ["lane"])
+SESSIONS_CLOSED = Counter("recognizer_sessions_closed", "Motion sessions closed", ["lane"])
+# result: delivered, rejected (4xx the backend never accepts), failed (per event of a
+# failed request), spooled
+AUTO_CHECK_EVENTS = Counter("recognizer_auto_check_events", "auto_check event deliveries by result",
+                            ["lane", "result"])
+AUTO_CHECK_DELAY = Histogram("recognizer_auto_check_delay_seconds", "Plate event creation to delivery",
+                             ["lane"], buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 30, 60, 300, 3600))
+
+
+# the metric children of one lane, looked up once; observe() is the recognizer's stage hook
+class LaneMetrics:
+    def __init__(self, lane):
+        self.lane = lane
+        self.stages = {}
+        self.frame_seconds = FRAME_SECONDS.labels(lane)
+        self.frames_received = FRAMES_RECEIVED.labels(lane)
+        self.frames_dropped = FRAMES_DROPPED.labels(lane)
+        self.frames_processed = FRAMES_PROCESSED.labels(lane)
+        self.frames_failed = FRAMES_FAILED.labels(lane)
+        self.sessions_opened = SESSIONS_OPENED.labels(lane)
+        self.sessions_closed = SESSIONS_CLOSED.labels(lane)
+
+    def observe(self, stage, seconds):
+        child = self.stages.get(stage)
+        if child is None:
+            child = self.stages[stage] = STAGE_SECONDS.labels(self.lane, stage)
+        child.observe(seconds)
+
+
+def auto_check_event(event, result, delay=None):
+    lane = event.get("lane", "default")
+    AUTO_CHECK_EVENTS.labels(lane, result).inc()
+    if delay is not None:
+        AUTO_CHECK_DELAY.labels(lane).observe(delay)
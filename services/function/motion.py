@@ -0,0 +1,45 @@
+import cv2
+import numpy as np
+
+
+# per-frame motion gate of a lane: the frame is shrunk in grayscale (INTER_AREA averages
+# away the sensor noise the full-resolution blur was for) and compared with a running-average
+# background; motion is the count of changed pixels inside the lane's region of interest,
+# no contours. area_thresh is in pixels of the full frame, roi a polygon [(x, y), ...] in
+# full-frame pixels (None = whole frame), alpha the background update rate per frame
+class MotionGate:
+    def __init__(self, area_thresh, scale=0.25, pixel_thresh=25, alpha=0.3, roi=None):
+        self.scale = scale
+        self.pixel_thresh = pixel_thresh
+        self.alpha = alpha
+        self.roi = roi
+        self.min_changed = max(1, round(area_thresh * scale * scale))
+        self.size = None
+        self.background = None  # float32, small frame size
+        self.mask = None  # uint8 0/255 inside the ROI, None = whole frame
+
+    def _reset(self, frame_shape, gray):
+        h, w = frame_shape[:2]
+        self.size = (w, h)
+        self.background = gray.astype(np.float32)
+        self.mask = None
+        if self.roi:
+            self.mask = np.zeros(gray.shape, np.uint8)
+            points = np.array(self.roi, np.float32) * (gray.shape[1] / w, gray.shape[0] / h)
+            cv2.fillPoly(self.mask, [np.round(points).astype(np.int32)], 255)
+
+    def __call__(self, frame):
+        h, w = frame.shape[:2]
+        # gray first: shrinking one channel is about 3x cheaper than shrinking BGR
+        gray = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY),
+                          (max(1, round(w * self.scale)), max(1, round(h * self.scale))),
+                          interpolation=cv2.INTER_AREA)
+        if self.size != (w, h):
+            self._reset(frame.shape, gray)
+            return False
+        delta = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+        changed = cv2.threshold(delta, self.pixel_thresh, 255, cv2.THRESH_BINARY)[1]
+        if self.mask is not None:
+            changed = cv2.bitwise_and(changed, self.mask)
+        cv2.accumulateWeighted(gray, self.background, self.alpha)
+        return cv2.countNonZero(changed) > self.min_changed
@@ -0,0 +1,145 @@
+import copy
+import os
+import re
+
+import numpy as np
+import torch
+
+# ONNX Runtime path for the YOLOv5 plate models. Each .pt is exported once to
+# <name>.onnx next to it, with dynamic batch, height and width axes, and loaded through
+# DetectMultiBackend/AutoShape like the .pt, so letterboxing, NMS and Detections stay
+# the same: inputs are letterboxed to the smallest multiple of the stride, 640x480
+# frames and 4:1 plate crops are not padded out to squares. The session
+# DetectMultiBackend creates is replaced by one with the graph optimizations and thread
+# counts set here. INT8 models (<name>_int8.onnx) are made offline by quantize.py, which
+# needs calibration images.
+
+
+def onnx_path(weights, precision="fp32"):
+    root, _ = os.path.splitext(weights)
+    return f"{root}.onnx" if precision == "fp32" else f"{root}_{precision}.onnx"
+
+
+def export(pt_model, path, size=640, opset=12):
+    # pt_model: the AutoShape model from torch.hub.load(..., path=<.pt>)
+    import onnx
+
+    model = copy.deepcopy(pt_model.model.model).float().eval()
+    detect = model.model[-1]
+    detect.inplace = False
+    detect.export = True  # single output tensor (batch, anchors, 5 + classes)
+    detect.onnx_dynamic = True  # grids computed in the graph from the input shape
+    im = torch.zeros(1, 3, size, size)
+    model(im)  # dry run before tracing, as yolov5 export.py
+    torch.onnx.export(model, im, path, opset_version=opset, do_constant_folding=True,
+                      input_names=['images'], output_names=['output'],
+                      dynamic_axes={'images': {0: 'batch', 2: 'height', 3: 'width'},
+                                    'output': {0: 'batch', 1: 'anchors'}})
+    # read back by DetectMultiBackend
+    model_onnx = onnx.load(path)
+    onnx.checker.check_model(model_onnx)
+    for key, value in {'stride': int(max(model.stride)), 'names': model.names}.items():
+        meta = model_onnx.metadata_props.add()
+        meta.key, meta.value = key, str(value)
+    onnx.save(model_onnx, path)
+
+
+def session_options(intra_op_threads, inter_op_threads):
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    # the YOLOv5 graph is a chain, parallel execution of branches does not pay off
+    options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = inter_op_threads
+    return options
+
+
+def load(pt_model, weights, options, precision="fp32"):
+    # AutoShape model running the ONNX export of pt_model (loaded from weights, a .pt path),
+    # exported when missing or older than the weights
+    import onnxruntime
+
+    path = onnx_path(weights, precision)
+    if precision != "fp32":
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} not found, run quantize.py first")
+    elif not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(weights):
+        export(pt_model, path)
+    model = torch.hub.load('yolov5', 'custom', path=path, source='local')
+    model.model.session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+    model.model.dynamic = True  # read by AutoShape to letterbox like the .pt
+    return model
+
+
+def max_difference(pt_model, onnx_model, size, batch=2, seed=0, height=None):
+    # largest difference between the raw outputs of both models on the same random input
+    # of height x size (square by default), box coordinates divided by the input size so
+    # every column is on a 0-1 scale
+    im = torch.from_numpy(np.random.default_rng(seed).random((batch, 3, height or size, size), np.float32))
+    with torch.no_grad():
+        expected = pt_model.model(im).numpy()
+    actual = onnx_model.model(im).numpy()
+    if expected.shape != actual.shape:
+        return float('inf')
+    scale = np.ones(expected.shape[-1], np.float32)
+    scale[:4] = size
+    return float(np.abs((expected - actual) / scale).max())
+
+
+# ====== INT8 ======
+
+
+class CalibrationReader:
+    # onnxruntime CalibrationDataReader over letterboxed images from yolov5 LoadImages,
+    # preprocessed like AutoShape does for the recognizer's frames and plate crops
+    def __init__(self, source, size, count):
+        from utils.datasets import LoadImages
+
+        self.batches = []
+        for _, img, _, _, _ in LoadImages(source, img_size=size):
+            # LoadImages flips to RGB, the recognizer hands AutoShape BGR frames as they come from cv2
+            im = np.ascontiguousarray(img[::-1], np.float32)[None] / 255
+            self.batches.append({'images': im})
+            if len(self.batches) >= count:
+                break
+        self.position = 0
+
+    def get_next(self):
+        if self.position >= len(self.batches):
+            return None
+        self.position += 1
+        return self.batches[self.position - 1]
+
+    def rewind(self):
+        self.position = 0
+
+
+def detect_head_nodes(path):
+    # box decoding of the Detect layer (the last model.N): sigmoid, grid/anchor arithmetic and
+    # the concat of pixel boxes with 0-1 scores, which one INT8 scale cannot represent
+    import onnx
+
+    nodes = onnx.load(path).graph.node
+    layers = [int(m.group(1)) for m in (re.match(r'^/model\.(\d+)/', n.name) for n in nodes) if m]
+    prefix = f'/model.{max(layers)}/'
+    return [n.name for n in nodes if n.name.startswith(prefix) and n.op_type != 'Conv']
+
+
+def quantize(fp32_path, int8_path, calibration):
+    # static QDQ quantization: per-channel INT8 weights, UINT8 activations from MinMax calibration
+    import onnx
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    prepared = int8_path + '.prep.onnx'
+    quant_pre_process(fp32_path, prepared, skip_symbolic_shape=True)  # symbolic inference is for transformers
+    try:
+        # per-channel DequantizeLinear (axis) needs opset 13, the FP32 export is opset 12
+        onnx.save(onnx.version_converter.convert_version(onnx.load(prepared), 13), prepared)
+        quantize_static(prepared, int8_path, calibration, quant_format=QuantFormat.QDQ, per_channel=True,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                        calibrate_method=CalibrationMethod.MinMax, nodes_to_exclude=detect_head_nodes(prepared))
+    finally:
+        os.remove(prepared)
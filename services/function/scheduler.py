@@ -0,0 +1,98 @@
+import collections
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+# micro-batching front for an AutoShape model: frames submitted from any lane are
+# collected for up to max_wait_ms (or max_batch frames) and run as one forward,
+# each caller gets back its own single-image Detections. callers() is the number of
+# lanes that may have a frame on the way (those in flight); the batch only waits while
+# it holds fewer frames than that, so a lone lane never waits
+class DetectionBatcher:
+    def __init__(self, model, size=640, max_batch=8, max_wait_ms=5.0, callers=None):
+        self.model = model
+        self.callers = callers or (lambda: 1)
+        self.size = size
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.batch_sizes = collections.Counter()
+        self.frames = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.forward_total = 0.0
+        self.thread = threading.Thread(target=self._run, name="detection-batcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, frame):
+        fut = Future()
+        self.queue.put((frame, time.perf_counter(), fut))
+        return fut
+
+    def __call__(self, frame):
+        return self.submit(frame).result()
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        deadline = batch[0][1] + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            if len(batch) >= self.callers():
+                timeout = 0  # nobody else to wait for, take only what is already queued
+            try:
+                batch.append(self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            start = time.perf_counter()
+            try:
+                results = self.model([frame for frame, _, _ in batch], size=self.size).tolist()
+            except Exception as e:
+                for _, _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            end = time.perf_counter()
+            with self.lock:
+                self.batch_sizes[len(batch)] += 1
+                self.frames += len(batch)
+                self.forward_total += end - start
+                for _, submitted, _ in batch:
+                    self.wait_total += start - submitted
+                    self.wait_max = max(self.wait_max, start - submitted)
+            for (_, _, fut), res in zip(batch, results):
+                fut.set_result(res)
+
+    def stats(self):
+        with self.lock:
+            batches = sum(self.batch_sizes.values())
+            return {
+                "queue_depth": self.queue.qsize(),
+                "frames": self.frames,
+                "batches": batches,
+                "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+                "mean_batch_size": self.frames / batches if batches else 0.0,
+                "mean_wait_ms": 1000 * self.wait_total / self.frames if self.frames else 0.0,
+                "max_wait_ms": 1000 * self.wait_max,
+                "mean_forward_ms": 1000 * self.forward_total / batches if batches else 0.0,
+            }
+
+
+# serialises calls into a model shared by several worker threads, AutoShape/Detect
+# rebuild their grids in place when the input shape changes; defaults are keyword
+# arguments added to every call (the fixed input size of an ONNX model)
+class LockedModel:
+    def __init__(self, model, **defaults):
+        self.model = model
+        self.defaults = defaults
+        self.lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self.lock:
+            return self.model(*args, **{**self.defaults, **kwargs})
@@ -0,0 +1,31 @@
+import contextlib
+import time
+
+
+# times the block into observe(stage, seconds); observe=None costs one check and no clock reads
+@contextlib.contextmanager
+def timed(observe, stage):
+    if observe is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+# runs run(), an AutoShape call returning yolov5 Detections, and splits its time into
+# <model>_preprocess (letterbox), <model>_forward and <model>_nms from Detections.times;
+# the rest of the call (waiting for the batcher or the model lock) is <model>_wait
+def detections_timed(observe, model, run):
+    if observe is None:
+        return run()
+    start = time.perf_counter()
+    results = run()
+    elapsed = time.perf_counter() - start
+    t = results.times
+    for stage, begin, end in zip(("preprocess", "forward", "nms"), t, t[1:]):
+        observe(f"{model}_{stage}", end - begin)
+    observe(f"{model}_wait", max(0.0, elapsed - (t[-1] - t[0])))
+    return results
@@ -54,9 +54,12 @@ def compute_skew(src_img, center_thres):
         return 0.0
     return (angle / cnt)*180/math.pi
 
-def deskew(src_img, change_cons, center_thres):
+def deskew_angle(src_img, change_cons, center_thres):
     if change_cons == 1:
-        return rotate_image(src_img, compute_skew(changeContrast(src_img), center_thres))
+        return compute_skew(changeContrast(src_img), center_thres)
     else:
-        return rotate_image(src_img, compute_skew(src_img, center_thres))
+        return compute_skew(src_img, center_thres)
+
+def deskew(src_img, change_cons, center_thres):
+    return rotate_image(src_img, deskew_angle(src_img, change_cons, center_thres))
 
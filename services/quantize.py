@@ -0,0 +1,144 @@
+import argparse
+import functools
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+import torch
+
+import function.helper as helper
+from function import onnx_backend
+from webcam_api import DETECTOR_WEIGHTS, OCR_WEIGHTS, settings
+
+# yolov5 LoadImages (calibration) and val.py (accuracy) are imported from the vendored repo
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'yolov5'))
+
+# Post-training INT8 quantization of both plate models for the onnx backend
+# (inference_backend="onnx", onnx_precision="int8" in webcam_api):
+#   python quantize.py --detector-calib data/frames --ocr-calib data/crops \
+#       --plates data/test_frames --detector-data LP_detection.yaml --ocr-data Letter_detect.yaml
+# writes model/<name>_int8.onnx next to the FP32 exports and a report with the latency
+# and accuracy of both precisions to model/quantization_report.json:
+#   latency        median forward of the first calibration image on ONNX Runtime, letterboxed
+#                  as the recognizer does (a plate-shaped input for the OCR model)
+#   val            mAP@0.5 and mAP@0.5:0.95 from yolov5 val.py on a labelled dataset
+#   plate_accuracy exact match of the plate read from each --plates frame (detector + OCR),
+#                  the expected plate is the file name up to the first '_', e.g. 30F-55775_2.jpg
+
+
+def latency_ms(path, im, options, runs):
+    import onnxruntime
+
+    session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+    session.run(None, {'images': im})
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        session.run(None, {'images': im})
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def validate(data, path, size):
+    import val
+
+    (_, _, map50, map50_95, *_), _, _ = val.run(data=data, weights=path, imgsz=size, batch_size=1,
+                                                device='cpu', half=False, plots=False)
+    return {'map50': float(map50), 'map50_95': float(map50_95)}
+
+
+def read_frame(detector, reader, frame, detector_size):
+    # the recognizer's path for one frame: most confident plate box, then staged OCR
+    boxes = detector(frame, size=detector_size).xyxy[0].tolist()
+    if not boxes:
+        return 'unknown'
+    x1, y1, x2, y2 = map(int, max(boxes, key=lambda b: b[4])[:4])
+    crop = frame[max(y1, 0):y2, max(x1, 0):x2]
+    if crop.size == 0:
+        return 'unknown'
+    return helper.read_plates_staged(reader, [crop], settings.ocr_accept_conf)[0][0]
+
+
+def plate_accuracy(pair, source, detector_size, ocr_size):
+    detector, reader = pair
+    reader = functools.partial(reader, size=ocr_size)
+    files = sorted(f for f in glob.glob(os.path.join(source, '*.*')) if cv2.haveImageReader(f))
+    correct = 0
+    for f in files:
+        expected = os.path.splitext(os.path.basename(f))[0].split('_')[0]
+        read = read_frame(detector, reader, cv2.imread(f), detector_size)
+        correct += helper.normalize_plate(read) == helper.normalize_plate(expected)
+    return {'images': len(files), 'exact_match': correct / len(files) if files else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Static INT8 quantization of the plate detector and OCR models")
+    parser.add_argument('--detector-calib', required=True, help='camera frames for detector calibration')
+    parser.add_argument('--ocr-calib', required=True, help='plate crops for OCR calibration')
+    parser.add_argument('--calib-count', type=int, default=200, help='images used per model')
+    parser.add_argument('--detector-size', type=int, default=settings.standard_width)
+    parser.add_argument('--ocr-size', type=int, default=settings.ocr_input_size)
+    parser.add_argument('--detector-data', help='dataset yaml for val.py on the detector')
+    parser.add_argument('--ocr-data', help='dataset yaml for val.py on the OCR model')
+    parser.add_argument('--plates', help='frames named after their plate, for the exact-match metric')
+    parser.add_argument('--threads', type=int, default=settings.onnx_intra_op_threads or os.cpu_count() or 1)
+    parser.add_argument('--runs', type=int, default=50, help='forwards per latency measurement')
+    parser.add_argument('--report', default='model/quantization_report.json')
+    args = parser.parse_args()
+
+    options = onnx_backend.session_options(args.threads, settings.onnx_inter_op_threads)
+    models = {'detector': (DETECTOR_WEIGHTS, args.detector_size, args.detector_calib, args.detector_data),
+              'ocr': (OCR_WEIGHTS, args.ocr_size, args.ocr_calib, args.ocr_data)}
+    loaded = {'fp32': [], 'int8': []}
+    report = {'threads': args.threads, 'models': {}}
+    for name, (weights, size, calib, data) in models.items():
+        pt_model = torch.hub.load('yolov5', 'custom', path=weights, source='local')
+        fp32 = onnx_backend.load(pt_model, weights, options)
+        fp32_path = onnx_backend.onnx_path(weights)
+        int8_path = onnx_backend.onnx_path(weights, 'int8')
+        calibration = onnx_backend.CalibrationReader(calib, size, args.calib_count)
+        print(f"Quantizing {fp32_path} -> {int8_path}")
+        onnx_backend.quantize(fp32_path, int8_path, calibration)
+        int8 = onnx_backend.load(pt_model, weights, options, 'int8')
+        if name == 'ocr':
+            fp32.conf = int8.conf = 0.6  # as in PlateModels.load
+        loaded['fp32'].append(fp32)
+        loaded['int8'].append(int8)
+
+        sample = calibration.batches[0]['images']
+        entry = {'size': size, 'input_shape': list(sample.shape), 'self_check': {
+            precision: onnx_backend.max_difference(pt_model, model, size)
+            for precision, model in (('fp32', fp32), ('int8', int8))}}
+        entry['latency_ms'] = {precision: latency_ms(path, sample, options, args.runs)
+                               for precision, path in (('fp32', fp32_path), ('int8', int8_path))}
+        entry['size_mb'] = {precision: os.path.getsize(path) / 1e6
+                            for precision, path in (('fp32', fp32_path), ('int8', int8_path))}
+        if data:
+            entry['val'] = {precision: validate(data, path, size)
+                            for precision, path in (('fp32', fp32_path), ('int8', int8_path))}
+        report['models'][name] = entry
+
+    if args.plates:
+        report['plate_accuracy'] = {precision: plate_accuracy(pair, args.plates, args.detector_size, args.ocr_size)
+                                    for precision, pair in loaded.items()}
+
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+    for name, entry in report['models'].items():
+        fp32_ms, int8_ms = entry['latency_ms']['fp32'], entry['latency_ms']['int8']
+        print(f"{name:>8}: fp32 {fp32_ms:.1f} ms, int8 {int8_ms:.1f} ms (x{fp32_ms / int8_ms:.2f}), "
+              f"self-check int8 {entry['self_check']['int8']:.3f}")
+        for precision, metrics in entry.get('val', {}).items():
+            print(f"{'':>8}  {precision} mAP@0.5 {metrics['map50']:.3f}  mAP@0.5:0.95 {metrics['map50_95']:.3f}")
+    for precision, metrics in report.get('plate_accuracy', {}).items():
+        print(f"  plates: {precision} exact match {metrics['exact_match']} on {metrics['images']} frames")
+    print(f"Report written to {args.report}")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,6 @@ import cv2
 import torch
 import time
 import collections
-import function.utils_rotate as utils_rotate
 import function.helper as helper
 
 # ====== CẤU HÌNH ======
@@ -13,6 +12,7 @@ MOTION_THRESH = 5000      # ngưỡng diện tích contour để coi là chuyể
 # nếu không có chuyển động liên tiếp trong bao nhiêu giây => kết thúc phiên
 NO_MOTION_TIME = 1.0
 MIN_DETECT_CNT = 3         # số lần tối thiểu để coi là “xác thực” biển
+OCR_ACCEPT_CONF = 0.75     # độ tin cậy trung bình ký tự để nhận kết quả không cần deskew
 
 # ====== NẠP MODEL YOLO ======
 yolo_LP_detect = torch.hub.load(
@@ -31,16 +31,10 @@ yolo_license_plate.conf = 0.60
 
 
 def read_license_plate(img):
-    """Thử deskew nhiều hướng, trả về lần đọc đầu tiên != 'unknown'"""
-    for cc in range(2):
-        for ct in range(2):
-            txt = helper.read_plate(
-                yolo_license_plate,
-                utils_rotate.deskew(img, cc, ct)
-            )
-            if txt != "unknown":
-                return txt
-    return "unknown"
+    """Đọc ảnh gốc trước, chỉ deskew khi kết quả chưa đủ tin cậy"""
+    txt, _, _ = helper.read_plates_staged(
+        yolo_license_plate, [img], OCR_ACCEPT_CONF)[0]
+    return txt
 
 
 def calculate_iou(b1, b2):
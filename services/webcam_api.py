@@ -1,7 +1,8 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, BackgroundTasks
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic_settings import BaseSettings
+from typing import Dict, List, Tuple
 import cv2
 import torch
 import time
@@ -10,20 +11,59 @@ import numpy as np
 import base64
 import datetime
 import asyncio
-from function import helper, utils_rotate
-import requests
+import json
+import os
+import struct
+from function import helper, onnx_backend
+from function.scheduler import DetectionBatcher, LockedModel
+from function.metrics import LaneMetrics
+from function.motion import MotionGate
+from function.timing import detections_timed, timed
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from function.broadcast import FrameHub
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from function.dispatcher import EventDispatcher
 
 # ====== CONFIG ======
 
 
 class Settings(BaseSettings):
     frames_per_process: int = 5  # Process every Nth frame instead of using fps
-    motion_thresh: int = 1000
+    motion_thresh: int = 1000  # changed area (pixels of the standard frame) that counts as motion
+    motion_scale: float = 0.25  # the motion gate works on the frame shrunk by this factor
+    motion_pixel_thresh: int = 25  # gray level change for a pixel to count as changed
+    motion_bg_alpha: float = 0.3  # running-average background update rate per frame
+    lane_roi: Dict[str, List[Tuple[int, int]]] = {}  # lane -> polygon (standard frame pixels) where motion counts
     no_motion_time: float = 1.0
     min_detect_cnt: int = 3
     standard_width: int = 640
     standard_height: int = 480
     no_signal_timeout: int = 10
+    ocr_accept_conf: float = 0.75  # accept a read without deskewing above this mean char confidence
+    skew_track_iou: float = 0.3  # IoU to reuse a plate's skew angle from the previous processed frame
+    lanes: List[str] = ["default"]  # camera/lane IDs registered at startup
+    max_lanes: int = 16  # lanes created on demand beyond the configured ones are capped here
+    detect_max_batch: int = 8  # frames from all lanes batched into one detector forward
+    detect_max_wait_ms: float = 5.0  # how long the first frame of a batch waits for other busy lanes
+    inference_workers: int = 4  # threads running decode + inference off the event loop
+    inference_backend: str = "torch"  # "torch" or "onnx" (ONNX Runtime on CPU, measure it with bench_recognizer.py first)
+    ocr_input_size: int = 640  # long side plate crops are letterboxed to for OCR on the onnx backend
+    onnx_intra_op_threads: int = 0  # per model, 0 splits the cores between detector and OCR
+    onnx_inter_op_threads: int = 1
+    onnx_check_tolerance: float = 1e-3  # startup self-check: max output difference to PyTorch
+    onnx_precision: str = "fp32"  # "int8" loads the models made by quantize.py
+    onnx_int8_check_iou: float = 0.7  # INT8 self-check: min plate box IoU to PyTorch on REFERENCE_IMAGE
+    # /video_feed tiers: name -> (jpeg quality, output width, 0 keeps the frame width)
+    stream_tiers: Dict[str, Tuple[int, int]] = {
+        "high": (95, 0), "medium": (75, 0), "low": (60, 320)}
+    backend_url: str = "http://backend:8000"
+    dispatch_queue_size: int = 1000  # plate events waiting for delivery before they go to the spool
+    dispatch_max_retries: int = 5
+    dispatch_backoff: float = 0.5  # seconds, doubled on every retry
+    dispatch_timeout: float = 5.0
+    spool_path: str = "spool/auto_check.jsonl"  # undelivered events, replayed when the backend is back
+    spool_replay_interval: float = 10.0
 
 
 settings = Settings()
@@ -38,28 +78,138 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# ====== RECOGNIZER CLASS ======
+# ====== MODELS ======
 
 
-class LicensePlateRecognizer:
+DETECTOR_WEIGHTS = 'model/LP_detector_nano_61.pt'
+OCR_WEIGHTS = 'model/LP_ocr_nano_62.pt'
+REFERENCE_IMAGE = 'images/tests/image.png'  # gate frame with a known plate, for the INT8 self-check
+
+
+# detector and OCR model, loaded once and shared by every lane
+class PlateModels:
     def __init__(self, cfg: Settings):
         self.cfg = cfg
-        self.device = 'cpu'
-        # model placeholders
+        self.backend = None
         self.detector = None
         self.reader = None
-        self.last_gray = None
+        self.ocr = None
+        self.batcher = None
+
+    def load(self, busy_lanes=None):
+        # busy_lanes(): lanes with a frame in flight, the detection batcher waits only for those
+        self.detector = torch.hub.load('yolov5', 'custom', path=DETECTOR_WEIGHTS, source='local')
+        self.reader = torch.hub.load('yolov5', 'custom', path=OCR_WEIGHTS, source='local')
+        self.reader.conf = 0.6
+        self.backend = "torch"
+        ocr_args = {}
+        if self.cfg.inference_backend == "onnx":
+            try:
+                self.detector, self.reader = self._load_onnx()
+                self.backend = "onnx" if self.cfg.onnx_precision == "fp32" else f"onnx-{self.cfg.onnx_precision}"
+                ocr_args = {"size": self.cfg.ocr_input_size}
+            except Exception as e:
+                print(f"ONNX Runtime backend not used, running PyTorch: {e}")
+        self.ocr = LockedModel(self.reader, **ocr_args)
+        self.batcher = DetectionBatcher(
+            self.detector, self.cfg.standard_width, self.cfg.detect_max_batch, self.cfg.detect_max_wait_ms,
+            busy_lanes)
+
+    def _load_onnx(self):
+        # both models or neither: each ONNX model must match its PyTorch model on the same input
+        threads = self.cfg.onnx_intra_op_threads or max(1, (os.cpu_count() or 2) // 2)
+        options = onnx_backend.session_options(threads, self.cfg.onnx_inter_op_threads)
+        precision = self.cfg.onnx_precision
+        models = []
+        # checked at the input shapes of the recognizer: a frame, a one-line plate letterbox (4:1)
+        for pt_model, weights, size, height in (
+                (self.detector, DETECTOR_WEIGHTS, self.cfg.standard_width, self.cfg.standard_height),
+                (self.reader, OCR_WEIGHTS, self.cfg.ocr_input_size, 32 * max(1, self.cfg.ocr_input_size // 128))):
+            model = onnx_backend.load(pt_model, weights, options, precision)
+            model.conf = pt_model.conf
+            diff = onnx_backend.max_difference(pt_model, model, size, height=height)
+            if precision == "fp32" and diff > self.cfg.onnx_check_tolerance:
+                raise RuntimeError(f"{weights}: ONNX {precision} output differs from PyTorch by {diff:.2e}")
+            print(f"ONNX Runtime {weights} {precision} at {size}x{height}, self-check difference {diff:.2e}")
+            models.append(model)
+        if precision != "fp32":
+            # quantized outputs drift too far for a bound on the raw outputs to mean anything,
+            # what must hold is the result: the same plates, read the same, as with PyTorch
+            self._check_reference(precision, *models)
+        return models
+
+    def _read_reference(self, detector, read):
+        # (box, plate) per plate found in REFERENCE_IMAGE, read as the recognizer reads it
+        frame = cv2.resize(cv2.imread(REFERENCE_IMAGE), (self.cfg.standard_width, self.cfg.standard_height))
+        boxes = [b[:4] for b in detector(frame, size=self.cfg.standard_width).xyxy[0].tolist()]
+        crops = [frame[max(int(y1), 0):int(y2), max(int(x1), 0):int(x2)] for x1, y1, x2, y2 in boxes]
+        reads = helper.read_plates_staged(read, crops, self.cfg.ocr_accept_conf)
+        return [(box, plate) for box, (plate, _, _) in zip(boxes, reads)]
+
+    def _check_reference(self, precision, detector, reader):
+        expected = self._read_reference(self.detector, self.reader)
+        actual = self._read_reference(detector, lambda imgs: reader(imgs, size=self.cfg.ocr_input_size))
+        if not expected:
+            raise RuntimeError(f"{REFERENCE_IMAGE}: no plate found by the PyTorch models")
+        if len(actual) != len(expected):
+            raise RuntimeError(f"{REFERENCE_IMAGE}: ONNX {precision} found {len(actual)} plates, "
+                               f"PyTorch {len(expected)}")
+        for pt_box, pt_plate in expected:
+            iou, plate = max((helper.box_iou(pt_box, box), plate) for box, plate in actual)
+            if iou < self.cfg.onnx_int8_check_iou or plate != pt_plate:
+                raise RuntimeError(f"{REFERENCE_IMAGE}: ONNX {precision} read {plate} (box IoU {iou:.2f}), "
+                                   f"PyTorch {pt_plate}")
+        print(f"ONNX Runtime {precision} reference check: {', '.join(p for _, p in actual)} as PyTorch")
+
+    def detect(self, frame):
+        return self.batcher(frame)
+
+# ====== RECOGNIZER CLASS ======
+
+
+# motion/session state of a single lane camera
+class LicensePlateRecognizer:
+    def __init__(self, cfg: Settings, models: PlateModels, events: EventDispatcher, lane_id: str = "default"):
+        self.cfg = cfg
+        self.models = models
+        self.events = events
+        self.lane_id = lane_id
+        self.device = 'cpu'
+        self.motion = MotionGate(cfg.motion_thresh, cfg.motion_scale, cfg.motion_pixel_thresh,
+                                 cfg.motion_bg_alpha, cfg.lane_roi.get(lane_id))
         self.motion_start = 0
         self.last_motion = 0
         self.frame_counter = 0  # Counter for frames to determine when to process
         self.counter = collections.Counter()
         self.session_active = False
         self.latest_frame = self._create_no_signal()
+        self.hub = FrameHub(self.latest_frame, cfg.stream_tiers)
         self.latest_plate = None
         self.last_boxes = []
+        self.skew_cache = []  # [(x1, y1, x2, y2), angle] of plates read on the last processed frame
         self.history = []
         self.current_plate = None
         self.last_frame_time = datetime.datetime.now()
+        # latest-frame-wins mailbox, filled on the event loop and drained by one pool worker
+        self.mailbox = None
+        self.mailbox_lock = threading.Lock()
+        self.worker_busy = False
+        self.frames_received = 0
+        self.frames_dropped = 0
+        self.frames_processed = 0
+        self.process_time = 0.0  # seconds spent in process() for the last frame
+        self.process_time_total = 0.0
+        self.process_time_ema = 0.0  # smoothed process() time, sent to binary clients as a send-rate hint
+        self.metrics = LaneMetrics(lane_id)
+        self.observe = self.metrics.observe  # observe(stage, seconds), the stages are listed in function/metrics.py
+
+    @property
+    def detector(self):
+        return self.models.detector
+
+    @property
+    def reader(self):
+        return self.models.reader
 
     def _create_no_signal(self):
         f = np.zeros((self.cfg.standard_height,
@@ -68,54 +218,35 @@ class LicensePlateRecognizer:
                     cv2.FONT_HERSHEY_COMPLEX, 1, (255, 255, 255), 2)
         return f
 
-    def load_models(self):
-        self.detector = torch.hub.load(
-            'yolov5', 'custom', path='model/LP_detector_nano_61.pt', source='local')
-        self.reader = torch.hub.load(
-            'yolov5', 'custom', path='model/LP_ocr_nano_62.pt', source='local')
-        self.reader.conf = 0.6
-
     def normalize(self, frame):
         h, w = frame.shape[:2]
         if (w, h) != (self.cfg.standard_width, self.cfg.standard_height):
             return cv2.resize(frame, (self.cfg.standard_width, self.cfg.standard_height))
         return frame
 
-    def _read_plate(self, img):
-        # try rotations
-        for cc in range(2):
-            for ct in range(2):
-                txt = helper.read_plate(
-                    self.reader, utils_rotate.deskew(img, cc, ct))
-                if txt != 'unknown':
-                    return txt
-        return 'unknown'
-
-    def _motion_check(self, frame_gray):
-        if self.last_gray is None:
-            self.last_gray = frame_gray
-            return False
-        if self.last_gray.shape != frame_gray.shape:
-            self.last_gray = frame_gray
-            return False
-        delta = cv2.absdiff(self.last_gray, frame_gray)
-        thresh = cv2.threshold(delta, 25, 255, cv2.THRESH_BINARY)[1]
-        cnts, _ = cv2.findContours(cv2.dilate(
-            thresh, None, iterations=2), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        self.last_gray = frame_gray
-        return any(cv2.contourArea(c) > self.cfg.motion_thresh for c in cnts)
-
-    def process(self, frame):
+    def _read_plates(self, coords, crops):
+        # reuse the skew angle of the overlapping plate from the last processed frame
+        angles = []
+        for box in coords:
+            iou, angle = max(((helper.box_iou(box, b), a) for b, a in self.skew_cache), default=(0.0, None))
+            angles.append(angle if iou >= self.cfg.skew_track_iou else None)
+        reads = helper.read_plates_staged(
+            self.models.ocr, crops, self.cfg.ocr_accept_conf, angles, self.observe)
+        self.skew_cache = [(box, angle) for box, (_, _, angle) in zip(coords, reads)]
+        return [txt for txt, _, _ in reads]
+
+    def process(self, frame, now=None):
+        # now: capture time in seconds, the wall clock by default (replayed footage passes its own)
         frame = self.normalize(frame)
-        now = time.time()
-        gray = cv2.GaussianBlur(cv2.cvtColor(
-            frame, cv2.COLOR_BGR2GRAY), (21, 21), 0)
-        motion = self._motion_check(gray)
+        now = time.time() if now is None else now
+        with timed(self.observe, "motion"):
+            motion = self.motion(frame)
 
         # manage session
         if motion:
             if not self.session_active:
                 self.session_active = True
+                self.metrics.sessions_opened.inc()
                 self.counter.clear()
                 self.current_plate = None
                 self.last_motion = now
@@ -123,22 +254,19 @@ class LicensePlateRecognizer:
         else:
             if self.session_active and now-self.last_motion > self.cfg.no_motion_time:
                 self.session_active = False
+                self.metrics.sessions_closed.inc()
                 if self.counter:
                     plate, count = self.counter.most_common(1)[0]
                     if count >= self.cfg.min_detect_cnt and plate != 'unknown':
                         # Chỉ gửi auto_check nếu biển số mới khác với lần trước đã gửi
                         if plate != self.latest_plate:
                             self.latest_plate = plate
-                            try:
-                                requests.post(
-                                    "http://backend:8000/auto_check",
-                                    json={"license_plate": self.latest_plate}
-                                )
-                            except Exception as e:
-                                print(f"Failed to call auto_check API: {e}")
+                            self.events.submit(
+                                {"license_plate": plate, "lane": self.lane_id})
                             self.history.append(plate)
                 self.counter.clear()
                 self.current_plate = None
+                self.skew_cache = []
 
         boxes = []
         # Increment frame counter and process only every Nth frame
@@ -148,13 +276,18 @@ class LicensePlateRecognizer:
 
         if self.session_active and self.frame_counter >= self.cfg.frames_per_process:
             self.frame_counter = 0  # Reset counter
-            results = self.detector(frame, size=self.cfg.standard_width)
-            for b in results.pandas().xyxy[0].values.tolist():
-                # b is [x1, y1, x2, y2, confidence, class, name]
+            results = detections_timed(self.observe, "detect", lambda: self.models.detect(frame))
+            coords, crops = [], []
+            for b in results.xyxy[0].tolist():
+                # b is [x1, y1, x2, y2, confidence, class]
                 x1, y1, x2, y2 = map(int, b[:4])
                 # optional: conf = b[4]; cls = b[5]
-                crop = frame[y1:y2, x1:x2]
-                plate = self._read_plate(crop)
+                crop = frame[max(y1, 0):y2, max(x1, 0):x2]
+                if crop.size == 0:
+                    continue
+                coords.append((x1, y1, x2, y2))
+                crops.append(crop)
+            for (x1, y1, x2, y2), plate in zip(coords, self._read_plates(coords, crops)):
                 self.counter[plate] += 1
                 if self.counter[plate] >= self.cfg.min_detect_cnt:
                     self.current_plate = plate
@@ -175,50 +308,251 @@ class LicensePlateRecognizer:
                         cv2.FONT_HERSHEY_SIMPLEX, 0.7, (100, 255, 0), 2)
 
         self.latest_frame = frame
+        self.hub.publish(frame)
         self.last_frame_time = datetime.datetime.now()
         return frame, self.latest_plate or "No plate detected", self.last_boxes
 
+    def submit(self, data, timestamp=None):
+        # called on the event loop; True when the caller must schedule drain() on the pool.
+        # timestamp: capture time sent by the camera client (s), None = time of processing
+        with self.mailbox_lock:
+            self.frames_received += 1
+            self.metrics.frames_received.inc()
+            if self.mailbox is not None:
+                self.frames_dropped += 1
+                self.metrics.frames_dropped.inc()
+            self.mailbox = (data, timestamp)
+            if self.worker_busy:
+                return False
+            self.worker_busy = True
+            return True
+
+    def drain(self):
+        while True:
+            with self.mailbox_lock:
+                pending, self.mailbox = self.mailbox, None
+                if pending is None:
+                    self.worker_busy = False
+                    return
+            data, timestamp = pending
+            try:
+                with timed(self.observe, "decode"):
+                    frame = decode_frame(data)
+                if frame is None:
+                    self.metrics.frames_failed.inc()
+                    continue
+                # sessions are timed by the capture clock; one ahead of the server's is clamped,
+                # a client that sends no timestamp (0) gets the server time
+                now = time.time()
+                if timestamp is not None and timestamp > 0:
+                    now = min(timestamp, now)
+                t0 = time.perf_counter()
+                self.process(frame, now)
+                self.process_time = time.perf_counter() - t0
+                self.process_time_total += self.process_time
+                self.process_time_ema = self.process_time if not self.process_time_ema else \
+                    0.8 * self.process_time_ema + 0.2 * self.process_time
+                self.frames_processed += 1
+                self.metrics.frame_seconds.observe(self.process_time)
+                self.metrics.frames_processed.inc()
+            except Exception as e:
+                self.metrics.frames_failed.inc()
+                print(f"Lane {self.lane_id}: failed to process frame: {e}")
+
+    def stats(self):
+        return {
+            "lane": self.lane_id,
+            "frames_received": self.frames_received,
+            "frames_dropped": self.frames_dropped,
+            "frames_processed": self.frames_processed,
+            "last_process_ms": 1000 * self.process_time,
+            "mean_process_ms": 1000 * self.process_time_total / self.frames_processed if self.frames_processed else 0.0,
+        }
+
+
+def decode_frame(data):
+    # raw JPEG bytes from binary messages, data URLs from the legacy text format
+    if isinstance(data, str):
+        if not data.startswith("data:image/jpeg;base64,"):
+            return None
+        data = base64.b64decode(data.split(',', 1)[1])
+    arr = np.frombuffer(data, np.uint8)
+    return cv2.imdecode(arr, cv2.IMREAD_COLOR)
+
+
+# binary frame header: version, lane id length, capture timestamp (s), sequence number,
+# followed by the lane id (utf-8, empty = lane from the URL) and the JPEG bytes
+FRAME_HEADER = struct.Struct("!BBdI")
+FRAME_VERSION = 1
+
+
+def parse_binary_frame(msg):
+    if len(msg) < FRAME_HEADER.size:
+        raise ValueError("frame shorter than header")
+    version, lane_len, timestamp, seq = FRAME_HEADER.unpack_from(msg)
+    if version != FRAME_VERSION:
+        raise ValueError(f"unsupported frame version {version}")
+    start = FRAME_HEADER.size + lane_len
+    lane = bytes(msg[FRAME_HEADER.size:start]).decode()
+    return lane, timestamp, seq, memoryview(msg)[start:]
+
+
+# ====== LANES ======
+
+
+# one recognizer per lane camera, all sharing the same PlateModels
+class LaneRegistry:
+    def __init__(self, cfg: Settings):
+        self.cfg = cfg
+        self.models = PlateModels(cfg)
+        self.events = EventDispatcher(
+            cfg.backend_url + "/auto_check", cfg.spool_path, cfg.dispatch_queue_size, cfg.dispatch_max_retries,
+            cfg.dispatch_backoff, cfg.dispatch_timeout, cfg.spool_replay_interval)
+        self.pool = ThreadPoolExecutor(
+            max_workers=cfg.inference_workers, thread_name_prefix="inference")
+        self.lanes = {}
+        self.loop = None
+        for lane_id in cfg.lanes:
+            self.get(lane_id, create=True)
 
-recognizer = LicensePlateRecognizer(settings)
+    def load_models(self):
+        self.models.load(self.busy_lanes)
+
+    def bind(self, loop):
+        # MJPEG hubs wake their viewers on this loop
+        self.loop = loop
+        for recognizer in self.lanes.values():
+            recognizer.hub.bind(loop)
+
+    def busy_lanes(self) -> int:
+        return sum(r.worker_busy for r in list(self.lanes.values()))
+
+    def min_interval(self, recognizer: LicensePlateRecognizer) -> float:
+        # lane process time, stretched when more lanes are busy than there are workers
+        busy = self.busy_lanes()
+        return recognizer.process_time_ema * max(1.0, busy / self.cfg.inference_workers)
+
+    def get(self, lane_id: str, create: bool = False) -> LicensePlateRecognizer:
+        # only camera connections create lanes, viewers of an unknown lane get a KeyError
+        if lane_id not in self.lanes:
+            if not create or len(self.lanes) >= self.cfg.max_lanes:
+                raise KeyError(lane_id)
+            self.lanes[lane_id] = LicensePlateRecognizer(
+                self.cfg, self.models, self.events, lane_id)
+            if self.loop is not None:
+                self.lanes[lane_id].hub.bind(self.loop)
+        return self.lanes[lane_id]
+
+
+lanes = LaneRegistry(settings)
+
+
+def get_lane(lane: str) -> LicensePlateRecognizer:
+    try:
+        return lanes.get(lane)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown lane: {lane}")
 
 
 @app.on_event("startup")
-def startup_event():
-    recognizer.load_models()
+async def startup_event():
+    lanes.bind(asyncio.get_running_loop())
+    lanes.load_models()
+    await lanes.events.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await lanes.events.stop()
 
 # ====== VIDEO STREAM ======
 
 
-def frame_generator():
-    while True:
-        frame, plate, boxes = recognizer.latest_frame, recognizer.latest_plate, recognizer.last_boxes
-        buf = cv2.imencode('.jpg', frame)[1].tobytes()
-        yield (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'+buf+b'\r\n')
-        time.sleep(0.04)
+@app.get("/lanes")
+async def list_lanes():
+    return {"lanes": [
+        {"lane": lane_id, "plate": r.latest_plate or "No plate detected", "session_active": r.session_active}
+        for lane_id, r in lanes.lanes.items()
+    ]}
+
+
+@app.get("/stats/detector")
+async def detector_stats():
+    if not lanes.models.batcher:
+        return {}
+    return {"backend": lanes.models.backend, **lanes.models.batcher.stats()}
+
+
+@app.get("/stats/lanes")
+async def lane_stats():
+    return {"lanes": [r.stats() for r in lanes.lanes.values()]}
+
+
+@app.get("/stats/dispatcher")
+async def dispatcher_stats():
+    return lanes.events.stats()
+
+
+@app.get("/metrics")
+async def metrics():
+    # Prometheus text format: stage histograms and frame/session/auto_check counters per lane
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 
 @app.get("/video_feed")
-async def video_feed():
-    return StreamingResponse(frame_generator(), media_type='multipart/x-mixed-replace; boundary=frame')
+async def video_feed(lane: str = "default", tier: str = "high"):
+    recognizer = get_lane(lane)
+    if tier not in settings.stream_tiers:
+        raise HTTPException(status_code=400, detail=f"Unknown tier: {tier}")
+    return StreamingResponse(recognizer.hub.stream(tier), media_type='multipart/x-mixed-replace; boundary=frame')
 
 
 @app.get("/get_plate")
-async def get_plate():
+async def get_plate(lane: str = "default"):
+    recognizer = get_lane(lane)
     return {"plate": recognizer.latest_plate or "No plate detected", "boxes": recognizer.last_boxes}
 
 
 @app.websocket("/ws/stream")
-async def ws_stream(websocket: WebSocket):
+async def ws_stream(websocket: WebSocket, lane: str = "default"):
+    try:
+        recognizer = lanes.get(lane, create=True)
+    except KeyError:
+        await websocket.close(code=1008)
+        return
     await websocket.accept()
+    loop = asyncio.get_running_loop()
     try:
         while True:
-            data = await websocket.receive_text()
-            if data.startswith("data:image/jpeg;base64,"):
-                img = base64.b64decode(data.split(',', 1)[1])
-                arr = np.frombuffer(img, np.uint8)
-                frame = cv2.imdecode(arr, cv2.IMREAD_COLOR)
-                if frame is not None:
-                    recognizer.process(frame)
-            await asyncio.sleep(0)
+            msg = await websocket.receive()
+            if msg["type"] == "websocket.disconnect":
+                break
+            # decode and inference run on the pool, a frame arriving while the lane
+            # is busy replaces the pending one instead of queueing behind it
+            if msg.get("bytes") is not None:
+                try:
+                    lane_id, timestamp, seq, jpeg = parse_binary_frame(msg["bytes"])
+                    target = lanes.get(lane_id, create=True) if lane_id else recognizer
+                except ValueError as e:
+                    await websocket.send_text(json.dumps({"type": "error", "message": str(e)}))
+                    continue
+                except KeyError:
+                    await websocket.send_text(json.dumps({"type": "error", "message": f"Unknown lane: {lane_id}"}))
+                    continue
+                if target.submit(jpeg, timestamp):
+                    loop.run_in_executor(lanes.pool, target.drain)
+                await websocket.send_text(json.dumps({
+                    "type": "ack",
+                    "lane": target.lane_id,
+                    "seq": seq,
+                    "timestamp": timestamp,
+                    "dropped": target.frames_dropped,
+                    "process_ms": round(1000 * target.process_time_ema, 1),
+                    # frames sent faster than this only replace each other in the mailbox
+                    "min_interval_ms": round(1000 * lanes.min_interval(target), 1),
+                }))
+            elif (msg.get("text") or "").startswith("data:image/jpeg;base64,"):
+                if recognizer.submit(msg["text"]):
+                    loop.run_in_executor(lanes.pool, recognizer.drain)
     except WebSocketDisconnect:
         pass